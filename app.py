@@ -1,21 +1,83 @@
 import os
 import sqlite3
 import re
+import sys
+import csv
+import hashlib
+import gzip
+import json
+import queue
+import tempfile
+import threading
+import time
 from flask import (
     Flask, render_template, request, redirect,
-    url_for, session, flash
+    url_for, session, flash, Response, jsonify, send_file
 )
+from markupsafe import Markup
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from db_util import (
+    DB_PATH, STORAGE_MODE, SHARD_DIR,
+    CLASS_COUNT, LAB_COUNT, HW_COUNT, QUIZ_COUNT,
+    HW_KEYS, QUIZ_KEYS, LAB_KEYS, CLASS_KEYS,
+    sharded, shard_path, db_path, readonly_connect, compute_scores,
+)
+from score_writer import ScoreWriter
+from db_retry import RetryStats, with_retry
+from ranking import CourseRanking, parse_cutoffs
+from curve import CURVE_CATEGORIES, CURVE_METHODS, curve_course
+from course_stats import RunningStats
+from fragment_cache import CacheBudget, FragmentCache
+from jobs import JobRunner
+from report_cards import generate_report_cards
+
 # --------------------------------------------------------
 # CONFIG
 # --------------------------------------------------------
-DB_PATH = "grades.db"
-
-CLASS_COUNT = 15
-LAB_COUNT = 15
-HW_COUNT = 5       # ตาม requirement เดิม: HW1..HW5
-QUIZ_COUNT = 10
+# DB_PATH / STORAGE_MODE / SHARD_DIR / จำนวนช่องคะแนน อยู่ใน db_util.py
+# (ใช้ร่วมกับ worker process ที่ไม่ควร import app)
+
+# archive tier: course ที่ archive แล้วย้ายออกจาก DB หลักมาไว้ที่นี่
+ARCHIVE_DB_PATH = os.environ.get("ARCHIVE_DB_PATH", "grades_archive.db")
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")   # แบบบีบอัด (.db.gz)
+
+# group commit: รวมการเขียน scores จากหลาย request เป็น transaction เดียว
+GROUP_COMMIT = os.environ.get("GROUP_COMMIT", "1") == "1"
+GROUP_COMMIT_MS = float(os.environ.get("GROUP_COMMIT_MS", "5"))
+
+# DB locked: รอ lock ได้นานเท่าไร (busy timeout) และ retry ทั้ง transaction กี่ครั้ง
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+WRITE_RETRIES = int(os.environ.get("WRITE_RETRIES", "8"))
+
+# background jobs (import / export / recompute / curve): ไฟล์ผลลัพธ์ + จำนวน thread
+JOB_DIR = os.environ.get("JOB_DIR", "jobs")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# จำนวน process ที่ใช้ render report card (ค่าเริ่มต้น = จำนวน core)
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "0")) or None
+
+# cache HTML ของตารางนักศึกษา (หน้า admin_course) จำกัดขนาดรวมเป็น MB
+FRAGMENT_CACHE_MB = float(os.environ.get("FRAGMENT_CACHE_MB", "32"))
+# memo ผลของ compute_scores ต่อแถว (MB) และงบรวมของทุก cache ข้างบน (MB)
+SCORE_CACHE_MB = float(os.environ.get("SCORE_CACHE_MB", "16"))
+CACHE_BUDGET_MB = float(os.environ.get("CACHE_BUDGET_MB", "40"))
+# live dashboard: ตรวจ version ของ course ที่มีคนเปิด dashboard อยู่ทุกกี่วินาที
+LIVE_POLL_SECONDS = float(os.environ.get("LIVE_POLL_SECONDS", "1"))
+# หน้า shell ของ student dashboard (ไม่มีข้อมูลส่วนตัว) ให้ browser / proxy cache กี่วินาที
+DASHBOARD_SHELL_MAX_AGE = int(os.environ.get("DASHBOARD_SHELL_MAX_AGE", "86400"))
+
+# คอลัมน์จริงของตาราง scores (ใช้ตอน copy แถวข้ามไฟล์)
+SCORE_COLUMNS = (
+    [
+        "id", "course", "user_id", "fullname", "password", "status",
+        "mid_term", "final", "project1", "project2",
+        "class_factor", "lab_factor", "hw_factor", "quiz_factor",
+    ]
+    + [f"class_{i}" for i in range(1, CLASS_COUNT + 1)]
+    + [f"lab_{i}" for i in range(1, LAB_COUNT + 1)]
+    + [f"hw_{i}" for i in range(1, HW_COUNT + 1)]
+    + [f"quiz_{i}" for i in range(1, QUIZ_COUNT + 1)]
+)
 
 app = Flask(__name__)
 app.secret_key = "CHANGE_THIS_TO_SOMETHING_RANDOM"
@@ -24,47 +86,54 @@ app.secret_key = "CHANGE_THIS_TO_SOMETHING_RANDOM"
 # --------------------------------------------------------
 # DB helpers
 # --------------------------------------------------------
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+_ready_shards = set()
+
+
+class CourseNotFound(Exception):
+    """shard mode: ขอ DB ของ course ที่ไม่มีใน catalog (URL ผิด / ถูก archive ไปแล้ว)"""
+
+
+def get_db(course_id=None, create=False):
+    """เลือก DB ให้ route
+
+    - single mode: ได้ grades.db เสมอ
+    - shard mode : course_id=None / 'All' ได้ catalog (courses + admin row)
+                   course อื่นได้ shard ของ course นั้น โดย ATTACH catalog ไว้
+                   ทำให้ query `courses` แบบเดิมยังใช้ได้ (หาใน catalog)
+                   ไม่มีไฟล์ shard และไม่มี course ใน catalog -> CourseNotFound
+                   (create=True: ตอนสร้าง course ใหม่ ให้สร้างไฟล์ได้เลย)
+    """
+    if not sharded() or course_id in (None, "All"):
+        conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    path = shard_path(course_id)
+    if not os.path.exists(path):
+        _ready_shards.discard(path)
+        if not create:
+            catalog = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+            exists = catalog.execute(
+                "SELECT 1 FROM courses WHERE course=?", (course_id,)
+            ).fetchone()
+            catalog.close()
+            if not exists:
+                raise CourseNotFound(course_id)
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
+    if path not in _ready_shards:
+        # ทุก worker migrate shard ตอน start พร้อมกัน: lock ก่อน (ALTER TABLE ซ้ำจะ error)
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        _init_scores_schema(cur)
+        conn.commit()
+        _ready_shards.add(path)
+    conn.execute("ATTACH DATABASE ? AS catalog", (DB_PATH,))
     return conn
 
 
-def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-
-    # -----------------------------
-    # courses table
-    # -----------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS courses (
-        course TEXT PRIMARY KEY,
-        name   TEXT NOT NULL,
-        status TEXT NOT NULL CHECK (status IN ('active', 'suspend')),
-
-        -- max scores
-        max_total REAL,
-        max_mid   REAL,
-        max_final REAL,
-        max_class REAL,
-        max_lab   REAL,
-        max_hw    REAL,
-        max_quiz  REAL,
-        max_p1    REAL,
-        max_p2    REAL,
-
-        -- default factors
-        class_factor REAL,
-        lab_factor   REAL,
-        hw_factor    REAL,
-        quiz_factor  REAL
-    );
-    """)
-
-    # -----------------------------
-    # scores table (per student)
-    # -----------------------------
+def _init_scores_schema(cur):
+    """สร้างตาราง scores (ใช้ทั้ง grades.db และแต่ละ shard)"""
     # one row per (course, user_id)
     # admin row: (course='All', user_id='admin')
     cols_class = ", ".join([f"class_{i} REAL" for i in range(1, CLASS_COUNT + 1)])
@@ -99,6 +168,252 @@ def init_db():
         UNIQUE(course, user_id)
     );
     """)
+    # user_id -> course ทั้งหมดที่ลงทะเบียน (login ครั้งเดียวดูทุก course)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_scores_user ON scores(user_id)")
+
+    # row version: เพิ่มทุกครั้งที่แถวถูก UPDATE (key ของ fragment cache ต่อแถว)
+    _ensure_column(cur, "scores", "version", "INTEGER NOT NULL DEFAULT 0")
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS scores_row_version
+    AFTER UPDATE ON scores WHEN NEW.version = OLD.version
+    BEGIN
+        UPDATE scores SET version = version + 1 WHERE id = NEW.id;
+    END;
+    """)
+
+    _init_search_index(cur)
+
+    # คะแนนแต่ละหมวด + total เป็น generated column (สูตรเดียวกับ compute_scores)
+    # ให้ filter / sort / top-N ทำใน SQLite ได้เลย
+    for col, expr in SCORE_SQL:
+        _ensure_column(cur, "scores", col, f"REAL GENERATED ALWAYS AS ({expr}) VIRTUAL")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scores_course_total ON scores(course, total)"
+    )
+    # เฉพาะนักศึกษาที่นับอันดับ: top-N / จำนวนคน / ranking อ่านจาก index อย่างเดียว
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_scores_ranked ON scores(course, total) "
+        "WHERE status='active' AND user_id<>'admin'"
+    )
+
+    # course version (ฝั่งข้อมูล): trigger เพิ่มเลขทุกครั้งที่ scores ของ course เปลี่ยน
+    # ใช้เป็น key ของ cache ต่อ course (ranking ฯลฯ)
+    # สถิติสะสมต่อ (course, หมวด) อัปเดตทีละแถวตอนเขียน (ดู update_course_stats)
+    # *_version = course version ตอนบันทึก ถ้าไม่ตรงกับปัจจุบันแปลว่า stale -> rebuild
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS course_stats (
+        course         TEXT NOT NULL,
+        category       TEXT NOT NULL,
+        n              INTEGER NOT NULL,
+        mean           REAL NOT NULL,
+        m2             REAL NOT NULL,
+        min_value      REAL,
+        max_value      REAL,
+        hist           TEXT NOT NULL,
+        config_version INTEGER NOT NULL,
+        data_version   INTEGER NOT NULL,
+        PRIMARY KEY (course, category)
+    );
+    """)
+
+    # updated_at = เวลา (UTC) ที่ scores ของ course เปลี่ยนล่าสุด (หน้า admin home)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS course_versions (
+        course     TEXT PRIMARY KEY,
+        version    INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    );
+    """)
+    _ensure_column(cur, "course_versions", "updated_at", "TEXT")
+    for event, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        name = f"scores_version_{event.lower()}"
+        old = cur.execute(
+            "SELECT sql FROM sqlite_master WHERE type='trigger' AND name=?", (name,)
+        ).fetchone()
+        if old and "updated_at" in old[0]:
+            continue
+        # DB เก่า: trigger ยังไม่ set updated_at -> สร้างใหม่
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(f"""
+        CREATE TRIGGER {name}
+        AFTER {event} ON scores
+        BEGIN
+            INSERT INTO course_versions (course, version, updated_at)
+            VALUES ({ref}.course, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(course) DO UPDATE
+            SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END;
+        """)
+
+
+def _ensure_column(cur, table, column, decl):
+    """เพิ่มคอลัมน์ให้ DB เก่าที่ยังไม่มี"""
+    # table_xinfo: รวม generated column ด้วย
+    cols = [r[1] for r in cur.execute(f"PRAGMA table_xinfo({table})")]
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _init_courses_schema(cur):
+    """สร้างตาราง courses (ใช้ทั้ง grades.db และ archive)"""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS courses (
+        course TEXT PRIMARY KEY,
+        name   TEXT NOT NULL,
+        status TEXT NOT NULL CHECK (status IN ('active', 'suspend')),
+
+        -- max scores
+        max_total REAL,
+        max_mid   REAL,
+        max_final REAL,
+        max_class REAL,
+        max_lab   REAL,
+        max_hw    REAL,
+        max_quiz  REAL,
+        max_p1    REAL,
+        max_p2    REAL,
+
+        -- default factors
+        class_factor REAL,
+        lab_factor   REAL,
+        hw_factor    REAL,
+        quiz_factor  REAL
+    );
+    """)
+    # เกณฑ์เกรด เช่น "A:80, B+:75, ..." (% ของ max_total), NULL = ค่าเริ่มต้น
+    _ensure_column(cur, "courses", "grade_cutoffs", "TEXT")
+    # course version (ฝั่ง config): เพิ่มทุกครั้งที่แก้ course
+    _ensure_column(cur, "courses", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _sum_sql(prefix, count):
+    return " + ".join(f"COALESCE({prefix}_{i}, 0)" for i in range(1, count + 1))
+
+
+# generated columns ของ scores: ใช้ factor ที่เก็บในแถว
+# (sync กับ courses ด้วย _sync_course_factors) factor เป็น NULL/0 ถือเป็น 1
+SCORE_SQL = [
+    ("hw_sum", _sum_sql("hw", HW_COUNT)),
+    ("quiz_sum", _sum_sql("quiz", QUIZ_COUNT)),
+    ("lab_sum", _sum_sql("lab", LAB_COUNT)),
+    ("class_sum", _sum_sql("class", CLASS_COUNT)),
+    ("hw_score", "hw_sum / COALESCE(NULLIF(hw_factor, 0), 1)"),
+    ("quiz_score", "quiz_sum / COALESCE(NULLIF(quiz_factor, 0), 1)"),
+    ("lab_score", "lab_sum / COALESCE(NULLIF(lab_factor, 0), 1)"),
+    ("class_score", "class_sum / COALESCE(NULLIF(class_factor, 0), 1)"),
+    ("total",
+     "COALESCE(mid_term, 0) + COALESCE(final, 0)"
+     " + COALESCE(project1, 0) + COALESCE(project2, 0)"
+     " + hw_score + quiz_score + lab_score + class_score"),
+]
+
+FACTOR_COLUMNS = ("class_factor", "lab_factor", "hw_factor", "quiz_factor")
+
+# ค่าที่ compute_scores คืน ในรูป expr ของ generated column (อ่านสรุปด้วย query เล็ก ๆ)
+SUMMARY_SQL = [
+    ("mid_term", "COALESCE(mid_term, 0)"),
+    ("final", "COALESCE(final, 0)"),
+    ("project1", "COALESCE(project1, 0)"),
+    ("project2", "COALESCE(project2, 0)"),
+    ("homework_sum", "hw_sum"),
+    ("homework_score", "hw_score"),
+    ("quiz_sum", "quiz_sum"),
+    ("quiz_score", "quiz_score"),
+    ("lab_sum", "lab_sum"),
+    ("lab_score", "lab_score"),
+    ("class_sum", "class_sum"),
+    ("class_score", "class_score"),
+    ("total", "total"),
+]
+_SUMMARY_SELECT = ", ".join(f"{expr} AS {key}" for key, expr in SUMMARY_SQL)
+
+
+def _sync_course_factors(conn, course_id=None):
+    """copy factor ของ courses ลงทุกแถวใน scores (เฉพาะแถวที่ยังไม่ตรง)
+
+    generated column `total` อ้างตาราง courses ไม่ได้ จึงต้องมี factor ในแถวเอง
+    conn ต้องเห็นทั้ง scores และ courses (get_db(course_id) ใน shard mode)
+    """
+    sets = ", ".join(f"{f} = c.{f}" for f in FACTOR_COLUMNS)
+    differs = " OR ".join(f"scores.{f} IS NOT c.{f}" for f in FACTOR_COLUMNS)
+    sql = (
+        f"UPDATE main.scores SET {sets} FROM courses c "
+        f"WHERE c.course = scores.course AND ({differs})"
+    )
+    if course_id is None:
+        conn.execute(sql)
+    else:
+        conn.execute(sql + " AND scores.course = ?", (course_id,))
+
+
+def _init_search_index(cur):
+    """FTS5 index ของ user_id / fullname (sync กับ scores ด้วย trigger)
+
+    SQLite ที่ไม่มี FTS5 จะข้ามไป แล้ว search_students ใช้ LIKE แทน
+    """
+    exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='scores_fts'"
+    ).fetchone()
+    try:
+        cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS scores_fts USING fts5(
+            user_id, fullname,
+            content='scores', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        );
+        """)
+    except sqlite3.OperationalError:
+        return
+
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS scores_fts_insert AFTER INSERT ON scores
+    BEGIN
+        INSERT INTO scores_fts (rowid, user_id, fullname)
+        VALUES (NEW.id, NEW.user_id, NEW.fullname);
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS scores_fts_delete AFTER DELETE ON scores
+    BEGIN
+        INSERT INTO scores_fts (scores_fts, rowid, user_id, fullname)
+        VALUES ('delete', OLD.id, OLD.user_id, OLD.fullname);
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS scores_fts_update
+    AFTER UPDATE OF user_id, fullname ON scores
+    BEGIN
+        INSERT INTO scores_fts (scores_fts, rowid, user_id, fullname)
+        VALUES ('delete', OLD.id, OLD.user_id, OLD.fullname);
+        INSERT INTO scores_fts (rowid, user_id, fullname)
+        VALUES (NEW.id, NEW.user_id, NEW.fullname);
+    END;
+    """)
+    if not exists:
+        # DB เดิมที่มีข้อมูลอยู่แล้ว: สร้าง index จากแถวที่มี
+        cur.execute("INSERT INTO scores_fts (scores_fts) VALUES ('rebuild')")
+
+
+def init_db():
+    """สร้าง / migrate schema (idempotent) เรียกตอน import app ทุก process"""
+    conn = get_db()
+    cur = conn.cursor()
+    # หลาย worker (gunicorn / uvicorn) start พร้อมกัน: ให้ migrate ทีละ process
+    # (ALTER TABLE / CREATE TRIGGER ซ้ำกันจะ error) migrate ครั้งแรกอาจนาน -> รอได้นานขึ้น
+    cur.execute("PRAGMA busy_timeout = 60000")
+    cur.execute("BEGIN IMMEDIATE")
+
+    # -----------------------------
+    # courses table
+    # -----------------------------
+    _init_courses_schema(cur)
+
+    # -----------------------------
+    # scores table (per student)
+    # -----------------------------
+    # shard mode: ใน catalog เหลือแค่ admin row
+    _init_scores_schema(cur)
 
     # ensure admin row exists
     cur.execute(
@@ -111,71 +426,1223 @@ def init_db():
             VALUES ('All', 'admin', 'Administrator', 'active', 1, 1, 1, 1)
         """)
 
+    # -----------------------------
+    # background jobs (ดู jobs.py)
+    # -----------------------------
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id               INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind             TEXT NOT NULL,
+        course           TEXT,
+        status           TEXT NOT NULL CHECK (status IN
+                             ('queued', 'running', 'done', 'failed', 'cancelled')),
+        progress         REAL NOT NULL DEFAULT 0,
+        message          TEXT,
+        result_name      TEXT,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        created_at       TEXT,
+        started_at       TEXT,
+        finished_at      TEXT
+    );
+    """)
+    # "host:pid" ของ process ที่รันงาน (recover ไม่แตะงานของ worker ที่ยังทำงานอยู่)
+    _ensure_column(cur, "jobs", "owner", "TEXT")
     conn.commit()
+    job_runner.recover()
+
+    if not sharded():
+        _sync_course_factors(conn)
+        conn.commit()
+
+    if sharded():
+        # index user_id -> course ข้าม shard (single mode ใช้ idx_scores_user)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS enrollments (
+            user_id TEXT NOT NULL,
+            course  TEXT NOT NULL,
+            PRIMARY KEY (user_id, course)
+        );
+        """)
+        # สรุปต่อ course สำหรับหน้า admin home (ดู refresh_course_summary)
+        # config_version = courses.version ตอนคำนวณ ไม่ตรงกันแปลว่า stale
+        # data_version = course_versions.version ของ shard ตอนคำนวณ
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS course_summary (
+            course          TEXT PRIMARY KEY,
+            enrolled        INTEGER NOT NULL,
+            active_count    INTEGER NOT NULL,
+            suspended_count INTEGER NOT NULL,
+            avg_total       REAL,
+            updated_at      TEXT,
+            config_version  INTEGER NOT NULL,
+            data_version    INTEGER NOT NULL
+        );
+        """)
+        conn.commit()
+
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        course_ids = [
+            r["course"] for r in cur.execute("SELECT course FROM courses")
+        ]
+        conn.close()
+        for course_id in course_ids:
+            _init_shard(course_id)
+        return
+
+    conn.close()
+
+
+retry_stats = RetryStats()
+
+
+def _retry(fn):
+    return with_retry(fn, attempts=WRITE_RETRIES, stats=retry_stats)
+
+
+def run_write(fn, course_id=None):
+    """เขียนแบบ transaction สั้น ๆ (ไม่ผ่าน writer thread) พร้อม retry เมื่อ DB locked
+
+    fn(conn) ห้าม commit เอง และอาจถูกเรียกซ้ำ -> ต้องไม่มี side effect นอก DB
+    """
+    def attempt():
+        conn = get_db(course_id)
+        try:
+            with conn:
+                return fn(conn)
+        finally:
+            conn.close()
+    return _retry(attempt)
+
+
+score_writer = ScoreWriter(get_db, db_path, interval=GROUP_COMMIT_MS / 1000,
+                           retry=_retry)
+
+
+job_runner = JobRunner(get_db, JOB_DIR, max_workers=JOB_WORKERS)
+
+
+def write_scores(course_id, fn):
+    """เขียน scores ของ course ผ่าน writer thread (group commit) แล้วรอจน commit
+
+    fn(conn) ทำ mutation ใน transaction ที่ writer เปิดไว้ ห้าม commit เอง
+    (ถ้า DB locked ทั้ง batch อาจถูกรันใหม่ -> fn ต้องเรียกซ้ำได้)
+    """
+    if not GROUP_COMMIT:
+        return run_write(fn, course_id)
+    return score_writer.run(course_id, fn)
+
+
+def _init_shard(course_id):
+    """เตรียม shard ของ course
+
+    - ย้ายแถว scores จาก grades.db (ตอนเปลี่ยนจาก single -> shard)
+    - เติม catalog.enrollments ให้ครบ
+    ทุก worker เรียกตอน start พร้อมกัน -> เขียนสอง DB ใน transaction เดียวอาจชนกัน
+    จึง retry ทั้ง transaction แบบ run_write
+    """
+    cols = ", ".join(SCORE_COLUMNS)
+
+    def migrate(conn):
+        conn.execute(
+            f"INSERT OR IGNORE INTO main.scores ({cols}) "
+            f"SELECT {cols} FROM catalog.scores WHERE course=?",
+            (course_id,)
+        )
+        conn.execute("DELETE FROM catalog.scores WHERE course=?", (course_id,))
+        conn.execute(
+            "INSERT OR IGNORE INTO catalog.enrollments (user_id, course) "
+            "SELECT user_id, course FROM main.scores WHERE course=?",
+            (course_id,)
+        )
+        _sync_course_factors(conn, course_id)
+
+    run_write(migrate, course_id)
+
+
+def _enroll(conn, course_id, user_id):
+    if sharded():
+        conn.execute(
+            "INSERT OR IGNORE INTO catalog.enrollments (user_id, course) VALUES (?, ?)",
+            (user_id, course_id)
+        )
+
+
+def _unenroll(conn, course_id, user_id):
+    if sharded():
+        conn.execute(
+            "DELETE FROM catalog.enrollments WHERE user_id=? AND course=?",
+            (user_id, course_id)
+        )
+
+
+def fetch_student_courses(user_id):
+    """[(row, course), ...] ของทุก course (active) ที่ user_id ลงทะเบียนไว้
+
+    single mode: query เดียว (scores JOIN courses ผ่าน idx_scores_user)
+    shard mode : อ่าน courses จาก catalog ครั้งเดียว แล้วอ่านแถวจากแต่ละ shard
+    """
+    if not sharded():
+        conn = get_db()
+        cur = conn.execute("""
+            SELECT s.*, NULL AS _split, c.*
+            FROM scores s
+            JOIN courses c ON c.course = s.course
+            WHERE s.user_id = ? AND c.status = 'active'
+            ORDER BY s.course
+        """, (user_id,))
+        names = [d[0] for d in cur.description]
+        split = names.index("_split")
+        result = [
+            (dict(zip(names[:split], r[:split])),
+             dict(zip(names[split + 1:], r[split + 1:])))
+            for r in cur.fetchall()
+        ]
+        conn.close()
+        return result
+
+    conn = get_db()
+    courses = conn.execute("""
+        SELECT c.* FROM enrollments e
+        JOIN courses c ON c.course = e.course
+        WHERE e.user_id = ? AND c.status = 'active'
+        ORDER BY c.course
+    """, (user_id,)).fetchall()
     conn.close()
 
+    result = []
+    for course in courses:
+        shard = get_db(course["course"])
+        row = shard.execute(
+            "SELECT * FROM scores WHERE course=? AND user_id=?",
+            (course["course"], user_id)
+        ).fetchone()
+        shard.close()
+        if row:
+            result.append((dict(row), dict(course)))
+    return result
+
 
 # --------------------------------------------------------
-# score computation
+# archive tier
 # --------------------------------------------------------
-def compute_scores(row_dict, course_row):
-    """row_dict = แถวจาก scores, course_row = แถวจาก courses"""
+# course ที่ archive แล้วอยู่ใน ARCHIVE_DB_PATH (courses + scores แบบเดียวกับ DB หลัก)
+# หรือถ้าเลือกบีบอัด จะเป็นไฟล์ SQLite ต่อ course แบบ gzip ใน ARCHIVE_DIR
+# (archive_files ใน ARCHIVE_DB_PATH จดไว้ว่า course ไหนอยู่ไฟล์ไหน)
+def _init_archive_db():
+    conn = sqlite3.connect(ARCHIVE_DB_PATH)
+    cur = conn.cursor()
+    _init_courses_schema(cur)
+    _init_scores_schema(cur)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS archive_files (
+        course TEXT PRIMARY KEY,
+        name   TEXT NOT NULL,
+        path   TEXT NOT NULL
+    );
+    """)
+    conn.commit()
+    conn.close()
 
-    # factor มาจาก course เท่านั้น
-    class_factor = course_row.get("class_factor") or 1
-    lab_factor   = course_row.get("lab_factor")   or 1
-    hw_factor    = course_row.get("hw_factor")    or 1
-    quiz_factor  = course_row.get("quiz_factor")  or 1
 
-    # Homework
-    hw_vals = [row_dict.get(f"hw_{i}", 0) or 0 for i in range(1, HW_COUNT + 1)]
-    hw_sum = sum(hw_vals)
-    hw_score = hw_sum / hw_factor if hw_factor else 0.0
+def _archive_file_path(course_id):
+    if not os.path.exists(ARCHIVE_DB_PATH):
+        return None
+    conn = readonly_connect(ARCHIVE_DB_PATH)
+    row = conn.execute(
+        "SELECT path FROM archive_files WHERE course=?", (course_id,)
+    ).fetchone()
+    conn.close()
+    return row["path"] if row else None
+
+
+def list_archived_courses():
+    if not os.path.exists(ARCHIVE_DB_PATH):
+        return []
+    conn = readonly_connect(ARCHIVE_DB_PATH)
+    rows = conn.execute("""
+        SELECT course, name, 0 AS compressed FROM courses
+        UNION ALL
+        SELECT course, name, 1 AS compressed FROM archive_files
+        ORDER BY course
+    """).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
 
-    # Quiz
-    quiz_vals = [row_dict.get(f"quiz_{i}", 0) or 0 for i in range(1, QUIZ_COUNT + 1)]
-    quiz_sum = sum(quiz_vals)
-    quiz_score = quiz_sum / quiz_factor if quiz_factor else 0.0
 
-    # Lab
-    lab_vals = [row_dict.get(f"lab_{i}", 0) or 0 for i in range(1, LAB_COUNT + 1)]
-    lab_sum = sum(lab_vals)
-    lab_score = lab_sum / lab_factor if lab_factor else 0.0
+def open_course_db(course_id):
+    """(conn, course_dict, archived) สำหรับอ่านข้อมูล course
 
-    # Class
-    class_vals = [row_dict.get(f"class_{i}", 0) or 0 for i in range(1, CLASS_COUNT + 1)]
-    class_sum = sum(class_vals)
-    class_score = class_sum / class_factor if class_factor else 0.0
+    หาใน DB หลักก่อน ถ้าไม่มีค่อย fallback ไป archive (อ่านอย่างเดียว)
+    ไม่เจอเลย -> (None, None, False)
+    """
+    conn = get_db()
+    course = conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
+    conn.close()
+    if course:
+        return get_db(course_id), dict(course), False
+
+    if os.path.exists(ARCHIVE_DB_PATH):
+        conn = readonly_connect(ARCHIVE_DB_PATH)
+        course = conn.execute(
+            "SELECT * FROM courses WHERE course=?", (course_id,)
+        ).fetchone()
+        if course:
+            return conn, dict(course), True
+        conn.close()
+
+    path = _archive_file_path(course_id)
+    if path and os.path.exists(path):
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        with open(path, "rb") as f:
+            conn.deserialize(gzip.decompress(f.read()))
+        conn.execute("PRAGMA query_only = ON")
+        course = conn.execute(
+            "SELECT * FROM courses WHERE course=?", (course_id,)
+        ).fetchone()
+        if course:
+            return conn, dict(course), True
+        conn.close()
 
-    mid = row_dict.get("mid_term") or 0.0
-    final = row_dict.get("final") or 0.0
-    p1 = row_dict.get("project1") or 0.0
-    p2 = row_dict.get("project2") or 0.0
+    return None, None, False
 
-    total = mid + final + p1 + p2 + hw_score + quiz_score + lab_score + class_score
 
-    return {
-        "mid_term": mid,
-        "final": final,
-        "project1": p1,
-        "project2": p2,
+def fetch_dicts(conn, sql, params=()):
+    """SELECT -> list ของ dict
+
+    เร็วกว่า dict(sqlite3.Row) หลายเท่าเมื่อดึงทั้ง course (แถวละ ~60 คอลัมน์)
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, r)) for r in cur]
+
+
+def _table_columns(conn, table, schema="main", hidden=False):
+    # table_info ไม่แสดง generated column, table_xinfo แสดงด้วย
+    pragma = "table_xinfo" if hidden else "table_info"
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.{pragma}({table})")]
+
 
-        "homework_sum": hw_sum,
-        "homework_score": hw_score,
+def archive_course(course_id, compress=False):
+    """ย้าย course + scores ออกจาก DB หลักไป archive ใน transaction เดียว"""
+    _init_archive_db()
+    conn = get_db(course_id)
+    course_cols = ", ".join(
+        _table_columns(conn, "courses", "catalog" if sharded() else "main")
+    )
+    # ไม่ copy id: id ของแต่ละ shard ซ้ำกันได้
+    score_list = [c for c in SCORE_COLUMNS if c != "id"]
+    score_cols = ", ".join(score_list)
+
+    if compress:
+        # สร้างไฟล์ SQLite เล็ก ๆ ของ course นี้ใน memory แล้ว gzip ลงดิสก์
+        course = conn.execute(
+            f"SELECT {course_cols} FROM courses WHERE course=?", (course_id,)
+        ).fetchone()
+        rows = conn.execute(
+            f"SELECT {score_cols} FROM main.scores WHERE course=?", (course_id,)
+        ).fetchall()
+        mem = sqlite3.connect(":memory:")
+        _init_courses_schema(mem.cursor())
+        _init_scores_schema(mem.cursor())
+        mem.execute(
+            f"INSERT INTO courses ({course_cols}) "
+            f"VALUES ({', '.join('?' * len(course))})", tuple(course)
+        )
+        mem.executemany(
+            f"INSERT INTO scores ({score_cols}) "
+            f"VALUES ({', '.join('?' * len(score_list))})",
+            [tuple(r) for r in rows]
+        )
+        mem.commit()
+        data = gzip.compress(mem.serialize())
+        mem.close()
+
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        path = os.path.join(ARCHIVE_DIR, os.path.basename(shard_path(course_id)) + ".gz")
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+    with conn:
+        if compress:
+            conn.execute(
+                "INSERT OR REPLACE INTO archive.archive_files (course, name, path) "
+                "SELECT course, name, ? FROM courses WHERE course=?",
+                (path, course_id)
+            )
+        else:
+            conn.execute(
+                f"INSERT OR REPLACE INTO archive.courses ({course_cols}) "
+                f"SELECT {course_cols} FROM courses WHERE course=?", (course_id,)
+            )
+            conn.execute("DELETE FROM archive.scores WHERE course=?", (course_id,))
+            conn.execute(
+                f"INSERT INTO archive.scores ({score_cols}) "
+                f"SELECT {score_cols} FROM main.scores WHERE course=?", (course_id,)
+            )
+        conn.execute("DELETE FROM main.scores WHERE course=?", (course_id,))
+        conn.execute("DELETE FROM main.course_versions WHERE course=?", (course_id,))
+        conn.execute("DELETE FROM main.course_stats WHERE course=?", (course_id,))
+        conn.execute("DELETE FROM courses WHERE course=?", (course_id,))
+        if sharded():
+            conn.execute("DELETE FROM catalog.enrollments WHERE course=?", (course_id,))
+            conn.execute("DELETE FROM catalog.course_summary WHERE course=?", (course_id,))
+    conn.close()
+    _rankings.pop(course_id, None)
+    fragment_cache.discard(lambda key: key[1] == course_id)
+    score_cache.discard(lambda key: key[0] == course_id)
+
+    if sharded():
+        # shard ว่างแล้ว ลบไฟล์ทิ้งได้เลย
+        path = shard_path(course_id)
+        _ready_shards.discard(path)
+        if os.path.exists(path):
+            os.remove(path)
+    else:
+        # คืนพื้นที่ให้ grades.db (ให้ขนาดไฟล์เหลือแค่ term ปัจจุบัน)
+        conn = get_db()
+        conn.execute("VACUUM")
+        conn.close()
 
-        "quiz_sum": quiz_sum,
-        "quiz_score": quiz_score,
 
-        "lab_sum": lab_sum,
-        "lab_score": lab_score,
+def unarchive_course(course_id):
+    """ย้าย course จาก archive กลับเข้า DB หลัก"""
+    _init_archive_db()
+    gz_path = _archive_file_path(course_id)
+    tmp_path = None
+    src = ARCHIVE_DB_PATH
+    if gz_path:
+        # แตกไฟล์บีบอัดเป็นไฟล์ชั่วคราวเพื่อ ATTACH
+        fd, tmp_path = tempfile.mkstemp(suffix=".db")
+        with os.fdopen(fd, "wb") as f, open(gz_path, "rb") as gz:
+            f.write(gzip.decompress(gz.read()))
+        src = tmp_path
+
+    conn = get_db(course_id, create=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (src,))
+        course_cols = ", ".join(_table_columns(conn, "courses", "archive"))
+        score_cols = ", ".join(c for c in SCORE_COLUMNS if c != "id")
+        with conn:
+            conn.execute(
+                f"INSERT INTO courses ({course_cols}) "
+                f"SELECT {course_cols} FROM archive.courses WHERE course=?", (course_id,)
+            )
+            conn.execute(
+                f"INSERT INTO main.scores ({score_cols}) "
+                f"SELECT {score_cols} FROM archive.scores WHERE course=?", (course_id,)
+            )
+            _sync_course_factors(conn, course_id)
+            # id / row version ของแถวที่ย้ายกลับอาจซ้ำกับก่อน archive
+            # -> เปลี่ยน config version ให้ cache ที่ผูกกับ course เก่าใช้ไม่ได้
+            conn.execute(
+                "UPDATE courses SET version = version + 1 WHERE course=?", (course_id,)
+            )
+            if sharded():
+                conn.execute(
+                    "INSERT OR IGNORE INTO catalog.enrollments (user_id, course) "
+                    "SELECT user_id, course FROM main.scores WHERE course=?", (course_id,)
+                )
+            if not gz_path:
+                conn.execute("DELETE FROM archive.scores WHERE course=?", (course_id,))
+                conn.execute("DELETE FROM archive.course_versions WHERE course=?", (course_id,))
+                conn.execute("DELETE FROM archive.courses WHERE course=?", (course_id,))
+    finally:
+        conn.close()
+        if tmp_path:
+            os.remove(tmp_path)
+
+    if gz_path:
+        conn = sqlite3.connect(ARCHIVE_DB_PATH)
+        with conn:
+            conn.execute("DELETE FROM archive_files WHERE course=?", (course_id,))
+        conn.close()
+        os.remove(gz_path)
+
+
+def clone_course(src_id, new_id, name, roster=True):
+    """สร้าง course ใหม่จาก course เดิม (live หรือ archive) คืนจำนวนนักศึกษาที่ copy
+
+    copy แถว courses (คะแนนเต็ม / factor / เกณฑ์เกรด) และถ้า roster=True
+    copy รายชื่อ (user_id, fullname, status) โดยคะแนนเป็น 0 และยังไม่มี password
+    ทั้งหมดเป็น INSERT ... SELECT ใน transaction เดียว (ไม่วนทีละคนใน Python)
+    raise sqlite3.IntegrityError ถ้า new_id มีอยู่แล้ว, LookupError ถ้าไม่เจอ src_id
+    """
+    conn = get_db()
+    live = conn.execute(
+        "SELECT 1 FROM courses WHERE course=?", (src_id,)
+    ).fetchone() is not None
+    conn.close()
+
+    tmp_path = None
+    source = None                   # ไฟล์ที่ต้อง ATTACH เป็น schema "source"
+    if not live:
+        if not any(c["course"] == src_id for c in list_archived_courses()):
+            raise LookupError(src_id)
+        source = ARCHIVE_DB_PATH
+        gz_path = _archive_file_path(src_id)
+        if gz_path:
+            # แตกไฟล์บีบอัดเป็นไฟล์ชั่วคราวเพื่อ ATTACH (แบบเดียวกับ unarchive)
+            fd, tmp_path = tempfile.mkstemp(suffix=".db")
+            with os.fdopen(fd, "wb") as f, open(gz_path, "rb") as gz:
+                f.write(gzip.decompress(gz.read()))
+            source = tmp_path
+    elif sharded() and roster:
+        source = shard_path(src_id)
+
+    zero_cols = ", ".join(RAW_SCORE_COLUMNS)
+    zeros = ", ".join("0" for _ in RAW_SCORE_COLUMNS)
+    factors = ", ".join(f"c.{f}" for f in FACTOR_COLUMNS)
+
+    def attempt():
+        conn = get_db(new_id, create=True)  # shard mode: สร้างไฟล์ shard ของ course ใหม่
+        try:
+            if source:
+                # ATTACH ต้องทำก่อนเปิด transaction
+                conn.execute("ATTACH DATABASE ? AS source", (source,))
+            src_courses = "courses" if live else "source.courses"
+            src_scores = "source.scores" if source else "main.scores"
+            dest_schema = "catalog" if sharded() else "main"
+            # archive ที่สร้างก่อนเพิ่มคอลัมน์ใหม่อาจมีคอลัมน์ไม่ครบ -> copy เฉพาะที่มีทั้งสองฝั่ง
+            src_cols = set(_table_columns(conn, "courses", dest_schema if live else "source"))
+            copy_cols = [
+                c for c in _table_columns(conn, "courses", dest_schema)
+                if c in src_cols and c not in ("course", "name", "status", "version")
+            ]
+            cols = ", ".join(copy_cols)
+            with conn:
+                conn.execute(
+                    f"INSERT INTO courses (course, name, status, {cols}) "
+                    f"SELECT ?, ?, 'active', {cols} FROM {src_courses} WHERE course=?",
+                    (new_id, name, src_id)
+                )
+                copied = 0
+                if roster:
+                    copied = conn.execute(
+                        f"INSERT INTO main.scores (course, user_id, fullname, password, "
+                        f"status, {zero_cols}, {', '.join(FACTOR_COLUMNS)}) "
+                        f"SELECT ?, s.user_id, s.fullname, '', s.status, {zeros}, {factors} "
+                        f"FROM {src_scores} s JOIN courses c ON c.course = ? "
+                        f"WHERE s.course = ? AND s.user_id <> 'admin'",
+                        (new_id, new_id, src_id)
+                    ).rowcount
+                    if sharded():
+                        conn.execute(
+                            "INSERT OR IGNORE INTO catalog.enrollments (user_id, course) "
+                            "SELECT user_id, course FROM main.scores WHERE course=?",
+                            (new_id,)
+                        )
+                rebuild_course_stats(conn, new_id)
+            return copied
+        finally:
+            conn.close()
+
+    try:
+        return _retry(attempt)
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
+
+
+# --------------------------------------------------------
+# admin home overview
+# --------------------------------------------------------
+# สถิติต่อ course ด้วย GROUP BY ครั้งเดียวต่อไฟล์ DB (ไม่ต้องเปิดทีละ course)
+_OVERVIEW_STATS = """
+    COUNT(s.id) AS enrolled,
+    COALESCE(SUM(s.status = 'active'), 0) AS active_count,
+    COALESCE(SUM(s.status = 'suspend'), 0) AS suspended_count,
+    AVG(CASE WHEN s.status = 'active' THEN s.total END) AS avg_total
+"""
+
+
+def course_overview():
+    """ทุก course + enrolled / active / suspended / avg_total / updated_at"""
+    conn = get_db()
+    if not sharded():
+        rows = fetch_dicts(conn, f"""
+            SELECT c.*, {_OVERVIEW_STATS}, v.updated_at
+            FROM courses c
+            LEFT JOIN scores s ON s.course = c.course AND s.user_id <> 'admin'
+            LEFT JOIN course_versions v ON v.course = c.course
+            GROUP BY c.course
+            ORDER BY c.course
+        """)
+        conn.close()
+        return rows
+
+    # shard mode: อ่านสรุปที่เก็บไว้ใน catalog ไม่ต้องเปิด shard ทีละไฟล์
+    rows = fetch_dicts(conn, """
+        SELECT c.*, s.enrolled, s.active_count, s.suspended_count, s.avg_total,
+               s.updated_at, s.config_version IS c.version AS summary_fresh
+        FROM courses c
+        LEFT JOIN course_summary s ON s.course = c.course
+        ORDER BY c.course
+    """)
+    conn.close()
+    for row in rows:
+        # ยังไม่เคยคำนวณ (course ใหม่ / unarchive / DB เก่า) หรือค่าตั้ง course เปลี่ยน
+        if not row.pop("summary_fresh"):
+            row.update(refresh_course_summary(row["course"]) or {})
+    return rows
 
-        "class_sum": class_sum,
-        "class_score": class_score,
 
-        "total": total,
+def refresh_course_summary(course_id):
+    """คำนวณสรุปของ course จาก shard แล้วเก็บลง catalog.course_summary (shard mode)
+
+    เรียกหลังเขียน scores (ดู _refresh_summary_on_change) คืน dict สรุป
+    หรือ None ถ้าไม่มี course
+    """
+    conn = get_db()
+    course = conn.execute(
+        "SELECT version FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
+    conn.close()
+    if course is None:
+        return None
+
+    summary = {"enrolled": 0, "active_count": 0, "suspended_count": 0,
+               "avg_total": None, "updated_at": None, "data_version": 0}
+    path = shard_path(course_id)
+    if os.path.exists(path):
+        shard = readonly_connect(path)
+        summary = fetch_dicts(shard, f"""
+            SELECT {_OVERVIEW_STATS},
+                   (SELECT updated_at FROM course_versions WHERE course = ?) AS updated_at,
+                   (SELECT COALESCE(MAX(version), 0) FROM course_versions
+                    WHERE course = ?) AS data_version
+            FROM scores s
+            WHERE s.course = ? AND s.user_id <> 'admin'
+        """, (course_id, course_id, course_id))[0]
+        shard.close()
+
+    # หลาย request refresh พร้อมกัน: อย่าให้ผลที่คำนวณจากข้อมูลเก่ากว่าทับของใหม่
+    run_write(lambda c: c.execute("""
+        INSERT INTO course_summary (course, enrolled, active_count, suspended_count,
+                                    avg_total, updated_at, config_version, data_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(course) DO UPDATE SET
+            enrolled = excluded.enrolled,
+            active_count = excluded.active_count,
+            suspended_count = excluded.suspended_count,
+            avg_total = excluded.avg_total,
+            updated_at = excluded.updated_at,
+            config_version = excluded.config_version,
+            data_version = excluded.data_version
+        WHERE excluded.config_version > course_summary.config_version
+           OR (excluded.config_version = course_summary.config_version
+               AND excluded.data_version >= course_summary.data_version)
+    """, (course_id, summary["enrolled"], summary["active_count"],
+          summary["suspended_count"], summary["avg_total"], summary["updated_at"],
+          course[0], summary["data_version"])))
+    del summary["data_version"]
+    return summary
+
+
+# --------------------------------------------------------
+# student search
+# --------------------------------------------------------
+def _fts_query(text):
+    """'som 650' -> '"som"* "650"*' (ทุกคำต้องตรง แบบ prefix)"""
+    tokens = [t for t in re.split(r"\s+", text.strip()) if t]
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in tokens)
+
+
+def _search_db(conn, text, limit):
+    try:
+        rows = conn.execute("""
+            SELECT s.id, s.course, s.user_id, s.fullname, s.status,
+                   c.name AS course_name, scores_fts.rank AS rank
+            FROM scores_fts
+            JOIN scores s ON s.id = scores_fts.rowid
+            JOIN courses c ON c.course = s.course
+            WHERE scores_fts MATCH ?
+            ORDER BY scores_fts.rank
+            LIMIT ?
+        """, (_fts_query(text), limit)).fetchall()
+    except sqlite3.OperationalError:
+        # ไม่มี FTS5: ใช้ LIKE (ช้ากว่า แต่ผลเหมือนกัน)
+        like = text.strip().replace("%", "").replace("_", "") + "%"
+        rows = conn.execute("""
+            SELECT s.id, s.course, s.user_id, s.fullname, s.status,
+                   c.name AS course_name, 0 AS rank
+            FROM scores s
+            JOIN courses c ON c.course = s.course
+            WHERE s.user_id LIKE ? OR s.fullname LIKE ?
+            ORDER BY s.user_id
+            LIMIT ?
+        """, (like, like, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def search_students(text, limit=50):
+    """ค้นหานักศึกษาทุก course ตามชื่อ / รหัส (prefix) เรียงตามความเกี่ยวข้อง"""
+    if not _fts_query(text):
+        return []
+    if not sharded():
+        conn = get_db()
+        results = _search_db(conn, text, limit)
+        conn.close()
+        return results
+
+    conn = get_db()
+    course_ids = [r["course"] for r in conn.execute("SELECT course FROM courses")]
+    conn.close()
+    results = []
+    for course_id in course_ids:
+        conn = get_db(course_id)
+        results.extend(_search_db(conn, text, limit))
+        conn.close()
+    results.sort(key=lambda r: r["rank"])
+    return results[:limit]
+
+
+# --------------------------------------------------------
+# score computation (compute_scores อยู่ใน db_util.py)
+# --------------------------------------------------------
+def _scores_size(scores):
+    return sys.getsizeof(scores) + sum(sys.getsizeof(v) for v in scores.values())
+
+
+cache_budget = CacheBudget(int(CACHE_BUDGET_MB * 1024 * 1024))
+score_cache = FragmentCache(int(SCORE_CACHE_MB * 1024 * 1024),
+                            budget=cache_budget, sizeof=_scores_size)
+
+
+def cached_scores(row_dict, course_row):
+    """compute_scores แบบ memo ด้วย key (course, id, row version, config version)
+
+    row_dict ต้องเป็นแถวจริงจาก DB (มี id / version) ไม่ใช่ค่าที่แก้แล้วยังไม่บันทึก
+    ผลลัพธ์ใช้ร่วมกันทุก request: ห้ามแก้ dict ที่ได้กลับไป
+    """
+    if row_dict.get("version") is None or course_row.get("version") is None:
+        return compute_scores(row_dict, course_row)
+    key = (row_dict["course"], row_dict["id"], row_dict["version"], course_row["version"])
+    scores = score_cache.get(key)
+    if scores is None:
+        scores = compute_scores(row_dict, course_row)
+        score_cache.set(key, scores)
+    return scores
+
+
+# --------------------------------------------------------
+# course version / ranking
+# --------------------------------------------------------
+def get_course_version(conn, course_id):
+    """(config version, data version) ของ course; conn ต้องมาจาก get_db(course_id)"""
+    row = conn.execute("""
+        SELECT c.version, COALESCE(v.version, 0)
+        FROM courses c
+        LEFT JOIN course_versions v ON v.course = c.course
+        WHERE c.course = ?
+    """, (course_id,)).fetchone()
+    return tuple(row) if row else None
+
+
+_rankings = {}   # course_id -> (version, CourseRanking)
+
+# HTML ของตาราง / แถวในหน้า admin_course (ดู _render_student_table)
+fragment_cache = FragmentCache(int(FRAGMENT_CACHE_MB * 1024 * 1024), budget=cache_budget)
+
+
+def get_course_ranking(conn, course_dict, totals=None):
+    """CourseRanking ของ course (สร้างใหม่เฉพาะตอน course version เปลี่ยน)
+
+    totals = total ของนักศึกษา active ที่คำนวณไว้แล้ว (ถ้ามี จะไม่ query ซ้ำ)
+    """
+    course_id = course_dict["course"]
+    version = get_course_version(conn, course_id)
+    hit = _rankings.get(course_id)
+    if hit and hit[0] == version:
+        return hit[1]
+
+    if totals is None:
+        # total เป็น generated column แล้ว ไม่ต้องคำนวณทีละแถวใน Python
+        totals = [r[0] for r in conn.execute(
+            "SELECT total FROM scores "
+            "WHERE course=? AND user_id<>'admin' AND status='active'",
+            (course_id,)
+        )]
+
+    try:
+        cutoffs = parse_cutoffs(course_dict.get("grade_cutoffs"))
+    except ValueError:
+        cutoffs = parse_cutoffs(None)
+    ranking = CourseRanking(totals, cutoffs, course_dict.get("max_total"))
+    _rankings[course_id] = (version, ranking)
+    return ranking
+
+
+# หมวดที่จัดอันดับได้ (expr ใน scores); total มี index ส่วนหมวดอื่นต้อง scan ทั้ง course
+LEADERBOARD_CATEGORIES = {
+    "total": "total",
+    "mid_term": "COALESCE(mid_term, 0)",
+    "final": "COALESCE(final, 0)",
+    "project1": "COALESCE(project1, 0)",
+    "project2": "COALESCE(project2, 0)",
+    "homework_score": "hw_score",
+    "quiz_score": "quiz_score",
+    "lab_score": "lab_score",
+    "class_score": "class_score",
+}
+_RANKED = "course=? AND status='active' AND user_id<>'admin'"
+
+
+def leaderboard(conn, course_id, category="total", limit=20, bottom=False):
+    """top-N (หรือ bottom-N) ของนักศึกษา active ด้วย window function
+
+    อ่านแค่แถวที่ติดอันดับ (รวมคะแนนเท่ากันที่ขอบ) จาก idx_scores_ranked
+    แต่ rank / percentile ยังเป็นค่าของทั้ง course:
+      top    : ทุกคนที่คะแนนสูงกว่าอยู่ในชุดนี้ -> RANK() OVER (DESC) ถูกต้อง
+      bottom : ทุกคนที่คะแนนต่ำกว่าอยู่ในชุดนี้ -> rank = n - (จำนวน <= x) + 1
+    rank / percentile ความหมายเดียวกับ CourseRanking (หน้า student)
+    percent_rank = PERCENT_RANK() ของทั้ง course (สัดส่วนคนที่ได้น้อยกว่า)
+    คืน (n, [{id, user_id, fullname, score, rank, percentile, percent_rank}])
+    """
+    expr = LEADERBOARD_CATEGORIES[category]
+    n = conn.execute(f"SELECT COUNT(*) FROM scores WHERE {_RANKED}",
+                     (course_id,)).fetchone()[0]
+    if not n or limit <= 0:
+        return n, []
+
+    if bottom:
+        bound, order = "<=", "ASC"
+        windows = (
+            "? - COUNT(*) OVER w + 1 AS rank, "
+            "100.0 * COUNT(*) OVER w / ? AS percentile, "
+            "(RANK() OVER w - 1) * 1.0 / MAX(? - 1, 1) AS percent_rank"
+        )
+    else:
+        bound, order = ">=", "DESC"
+        windows = (
+            "RANK() OVER w AS rank, "
+            "100.0 * (? - RANK() OVER w + 1) / ? AS percentile, "
+            "(? - COUNT(*) OVER w) * 1.0 / MAX(? - 1, 1) AS percent_rank"
+        )
+    params = [n] * windows.count("?")
+    # คะแนนของคนที่ N = เส้นตัด (คนน้อยกว่า N -> เอาทุกคน)
+    sql = f"""
+        SELECT id, user_id, fullname, score, {windows}
+        FROM (
+            SELECT id, user_id, fullname, {expr} AS score FROM scores
+            WHERE {_RANKED} AND {expr} {bound} COALESCE((
+                SELECT {expr} FROM scores WHERE {_RANKED}
+                ORDER BY {expr} {order} LIMIT 1 OFFSET ?
+            ), {'1e308' if bottom else '-1e308'})
+        )
+        WINDOW w AS (ORDER BY score {order})
+        ORDER BY score {order}, user_id
+    """
+    params += [course_id, course_id, limit - 1]
+    return n, fetch_dicts(conn, sql, params)
+
+
+# --------------------------------------------------------
+# course statistics (incremental)
+# --------------------------------------------------------
+# หมวด -> expression บน scores (generated column) ลำดับเดียวกับ DASHBOARD_KEYS + total
+STATS_SQL = (
+    ("mid_term", "COALESCE(mid_term, 0)"),
+    ("final", "COALESCE(final, 0)"),
+    ("project1", "COALESCE(project1, 0)"),
+    ("project2", "COALESCE(project2, 0)"),
+    ("class_score", "class_score"),
+    ("homework_score", "hw_score"),
+    ("quiz_score", "quiz_score"),
+    ("lab_score", "lab_score"),
+    ("total", "total"),
+)
+_STATS_SELECT = ", ".join(f"{expr} AS {key}" for key, expr in STATS_SQL)
+_STATS_MAX_COLUMN = dict(CURVE_CATEGORIES, total="max_total")
+
+
+def _stats_caps(course):
+    """ช่วงของ histogram ต่อหมวด = max ของหมวดนั้น (ไม่ตั้งไว้ใช้ max_total)"""
+    fallback = course["max_total"] or 100
+    return {key: course[_STATS_MAX_COLUMN[key]] or fallback for key, _ in STATS_SQL}
+
+
+def _row_stat_values(conn, row_id):
+    """ค่าทุกหมวดของแถวเดียว (None ถ้าไม่มีแถว / เป็น admin)"""
+    row = conn.execute(
+        f"SELECT {_STATS_SELECT} FROM main.scores WHERE id=? AND user_id<>'admin'",
+        (row_id,)
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+def stats_from_values(course, value_rows):
+    """สร้าง RunningStats ทุกหมวดจาก [(ค่าตามลำดับ STATS_SQL), ...]"""
+    caps = _stats_caps(course)
+    stats = {key: RunningStats(caps[key]) for key, _ in STATS_SQL}
+    for values in value_rows:
+        for (key, _), x in zip(STATS_SQL, values):
+            stats[key].add(x)
+    return stats
+
+
+def _load_stats(conn, course_id, course):
+    """(stats, version ตอนบันทึก) หรือ (None, None) ถ้ายังไม่มี"""
+    rows = conn.execute(
+        "SELECT category, n, mean, m2, min_value, max_value, hist, "
+        "config_version, data_version FROM main.course_stats WHERE course=?",
+        (course_id,)
+    ).fetchall()
+    if len(rows) != len(STATS_SQL):
+        return None, None
+    caps = _stats_caps(course)
+    stats = {r[0]: RunningStats.from_row(caps[r[0]], *r[1:7]) for r in rows}
+    return stats, (rows[0][7], rows[0][8])
+
+
+def _save_stats(conn, course_id, stats):
+    version = get_course_version(conn, course_id)
+    conn.executemany(
+        "INSERT OR REPLACE INTO main.course_stats "
+        "(course, category, n, mean, m2, min_value, max_value, hist, "
+        "config_version, data_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(course_id, key) + stats[key].to_row() + version for key, _ in STATS_SQL]
+    )
+
+
+def rebuild_course_stats(conn, course_id):
+    """คำนวณใหม่ทั้ง course (ตอน factor / max เปลี่ยน, curve, หรือ stats stale)"""
+    course = conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
+    if course is None:
+        return None
+    stats = stats_from_values(course, conn.execute(
+        f"SELECT {_STATS_SELECT} FROM main.scores WHERE course=? AND user_id<>'admin'",
+        (course_id,)
+    ))
+    _save_stats(conn, course_id, stats)
+    return stats
+
+
+def update_course_stats(conn, course_id, version_before, olds=(), news=()):
+    """ปรับ stats จากค่าแถวก่อน/หลัง (ต้องเรียกหลังเขียน scores ใน transaction เดียวกัน)
+
+    olds / news = ค่าตาม STATS_SQL ของแถวที่หายไป / แถวที่เพิ่มเข้ามา
+    version_before = course version ก่อนเขียน ถ้า stats ที่เก็บไว้ไม่ตรง -> rebuild
+    (เรียกแบบไม่มี olds / news = แค่ประทับ version ใหม่ เช่นแก้แค่ status)
+    """
+    course = conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
+    if course is None:
+        return
+    stats, version = _load_stats(conn, course_id, course)
+    if stats is None or version != version_before:
+        rebuild_course_stats(conn, course_id)
+        return
+
+    recompute = set()
+    for old in olds:
+        for (key, _), x in zip(STATS_SQL, old):
+            if stats[key].remove(x):
+                recompute.add(key)
+    for new in news:
+        for (key, _), x in zip(STATS_SQL, new):
+            stats[key].add(x)
+    recompute = [key for key, _ in STATS_SQL if key in recompute]
+
+    if recompute:
+        # ลบค่าที่เป็น min/max ออก: ให้ SQLite หาใหม่ (total ใช้ index course,total)
+        exprs = dict(STATS_SQL)
+        row = conn.execute(
+            "SELECT " + ", ".join(
+                f"MIN({exprs[k]}), MAX({exprs[k]})" for k in recompute
+            ) + " FROM main.scores WHERE course=? AND user_id<>'admin'",
+            (course_id,)
+        ).fetchone()
+        for i, key in enumerate(recompute):
+            stats[key].min, stats[key].max = row[2 * i], row[2 * i + 1]
+    _save_stats(conn, course_id, stats)
+
+
+def tracked_write(course_id, row_id, mutate):
+    """ห่อ mutation ของแถวเดียวให้ course_stats อัปเดตใน transaction เดียวกัน
+
+    row_id = None ตอน insert (ใช้ค่าที่ mutate return เป็น id ของแถวใหม่)
+    """
+    def fn(w):
+        version = get_course_version(w, course_id)
+        old = _row_stat_values(w, row_id) if row_id is not None else None
+        result = mutate(w)
+        new = _row_stat_values(w, result if row_id is None else row_id)
+        update_course_stats(w, course_id, version,
+                            [old] if old else [], [new] if new else [])
+        return result
+    return fn
+
+
+def untracked_write(course_id, mutate):
+    """mutation ของ scores ที่ไม่แตะคะแนน (เช่น password) ประทับ version ใหม่ให้ course_stats
+
+    ไม่อย่างนั้น course_versions ที่ trigger เพิ่มให้จะทำให้ stats ถูก rebuild ทั้ง course
+    """
+    def fn(w):
+        version = get_course_version(w, course_id)
+        result = mutate(w)
+        update_course_stats(w, course_id, version)
+        return result
+    return fn
+
+
+def get_course_stats(course_id):
+    """{หมวด: summary} ของ course live อ่านจาก course_stats (ไม่ scan scores)"""
+    conn = get_db(course_id)
+    course = conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
+    if course is None:
+        conn.close()
+        return None
+    stats, version = _load_stats(conn, course_id, course)
+    current = get_course_version(conn, course_id)
+    conn.close()
+    if stats is None or version != current:
+        stats = write_scores(course_id, lambda w: rebuild_course_stats(w, course_id))
+    return {key: s.summary() for key, s in stats.items()}
+
+
+# --------------------------------------------------------
+# score validation
+# --------------------------------------------------------
+RAW_SCORE_COLUMNS = (["mid_term", "final", "project1", "project2"]
+                     + CLASS_KEYS + LAB_KEYS + HW_KEYS + QUIZ_KEYS)
+VALIDATION_RULES = {
+    "negative": "Negative score",
+    "over_max": "Above the course maximum",
+    "factor": "Factor differs from the course (total is stale)",
+}
+
+
+def _validation_checks(course):
+    """[(คอลัมน์, rule, limit, expr ที่ได้ค่าเมื่อผิด / NULL เมื่อถูก)] + params"""
+    checks, params = [], []
+    for col in RAW_SCORE_COLUMNS:
+        checks.append((col, "negative", 0, f"CASE WHEN {col} < 0 THEN {col} END"))
+    for key, expr in STATS_SQL:
+        cap = course[_STATS_MAX_COLUMN[key]]
+        if cap and cap > 0:      # ไม่ได้ตั้งคะแนนเต็ม = ไม่ตรวจ
+            checks.append((key, "over_max", cap,
+                           f"CASE WHEN {expr} > ? + 1e-9 THEN {expr} END"))
+            params.append(cap)
+    for f in FACTOR_COLUMNS:
+        checks.append((f, "factor", course[f],
+                       f"CASE WHEN {f} IS NOT ? THEN COALESCE({f}, 'NULL') END"))
+        params.append(course[f])
+    return checks, params
+
+
+def validate_course(conn, course, user_ids=None):
+    """ตรวจคะแนนทั้ง course ใน query เดียว (scan scores รอบเดียว)
+
+    ทุกเงื่อนไขเป็นคอลัมน์ CASE ใน SELECT เดียวกัน SQLite คัดเฉพาะแถวที่ผิด
+    แล้ว Python แค่แตกคอลัมน์ที่ไม่เป็น NULL ออกเป็นรายการ
+    user_ids = ตรวจเฉพาะนักศึกษาเหล่านี้ (เช่นแถวที่เพิ่ง import)
+    คืน [{id, user_id, fullname, column, rule, value, limit}] เรียงตาม user_id
+    """
+    checks, params = _validation_checks(course)
+    flags = ", ".join(f"{expr} AS v{i}" for i, (_, _, _, expr) in enumerate(checks))
+    sql = (
+        f"SELECT * FROM (SELECT id, user_id, fullname, {flags} FROM scores "
+        f"WHERE course=? AND user_id<>'admin'"
+    )
+    params.append(course["course"])
+    if user_ids is not None:
+        sql += " AND user_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(user_ids)))
+    sql += (") WHERE " + " OR ".join(f"v{i} IS NOT NULL" for i in range(len(checks)))
+            + " ORDER BY user_id")
+
+    violations = []
+    for row in conn.execute(sql, params):
+        for i, (column, rule, limit, _) in enumerate(checks):
+            value = row[3 + i]
+            if value is not None:
+                violations.append({
+                    "id": row[0], "user_id": row[1], "fullname": row[2],
+                    "column": column, "rule": rule, "value": value, "limit": limit,
+                })
+    return violations
+
+
+# --------------------------------------------------------
+# score change notifications
+# --------------------------------------------------------
+# หมวดคะแนน (ใช้บอก cache ว่าหมวดไหนเปลี่ยน)
+SCORE_CATEGORIES = (
+    "mid_term", "final", "project1", "project2",
+    "homework", "quiz", "lab", "class",
+)
+
+_ITEM_CATEGORY = {"hw": "homework", "quiz": "quiz", "lab": "lab", "class": "class"}
+
+
+def column_category(col):
+    """คอลัมน์ใน scores -> หมวดคะแนน ('profile' = ไม่ใช่คะแนน เช่น fullname)"""
+    if col in ("mid_term", "final", "project1", "project2"):
+        return col
+    prefix, _, num = col.rpartition("_")
+    if num.isdigit() and prefix in _ITEM_CATEGORY:
+        return _ITEM_CATEGORY[prefix]
+    return "profile"
+
+
+_score_listeners = []
+
+
+def on_score_change(fn):
+    """decorator ลงทะเบียน cache ที่ต้องรู้เมื่อแถว scores เปลี่ยน
+
+    fn(course_id, student_id, categories, old, new)
+    old / new = dict ของแถวก่อน/หลัง (None ตอน add / delete)
+    student_id = None แปลว่าเปลี่ยนทั้ง course (เช่น curve)
+    """
+    _score_listeners.append(fn)
+    return fn
+
+
+def notify_score_change(course_id, student_id, categories, old=None, new=None):
+    for fn in _score_listeners:
+        fn(course_id, student_id, frozenset(categories), old, new)
+
+
+@on_score_change
+def _refresh_summary_on_change(course_id, student_id, categories, old, new):
+    # shard mode: สรุปบนหน้า admin home เก็บใน catalog (ดู course_overview)
+    # status (profile) ก็มีผลกับจำนวน active / suspended -> refresh ทุกหมวด
+    if sharded():
+        refresh_course_summary(course_id)
+
+
+# --------------------------------------------------------
+# live dashboard (Server-Sent Events)
+# --------------------------------------------------------
+# ลำดับเดียวกับกราฟ "Average Category Scores" ใน admin_dashboard.html
+DASHBOARD_KEYS = (
+    "mid_term", "final", "project1", "project2",
+    "class_score", "homework_score", "quiz_score", "lab_score",
+)
+LIVE_KEEPALIVE = 15     # วินาที: ส่ง comment กัน proxy ตัด connection
+LIVE_QUEUE_SIZE = 256
+
+# แต่ละ process มี thread เดียว poll course_versions (ใน DB = ใช้ร่วมกันทุก worker)
+# ของ course ที่มีคน subscribe แล้วกระจาย snapshot ให้ queue ใน process ตัวเอง
+# การแก้คะแนนจาก worker ไหนก็ตามจึงไปถึงทุก browser
+_live_lock = threading.Lock()
+_live_subscribers = {}  # course_id -> set ของ queue.Queue (1 queue ต่อ browser)
+_live_versions = {}     # course_id -> course version ที่ส่ง snapshot ไปล่าสุด
+_live_poller = None     # (pid, thread)
+
+
+def live_subscribe(course_id):
+    q = queue.Queue(LIVE_QUEUE_SIZE)
+    with _live_lock:
+        _live_subscribers.setdefault(course_id, set()).add(q)
+        _ensure_live_poller()
+    return q
+
+
+def live_unsubscribe(course_id, q):
+    with _live_lock:
+        subs = _live_subscribers.get(course_id)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                del _live_subscribers[course_id]
+                _live_versions.pop(course_id, None)
+
+
+def _live_publish(course_id, event):
+    with _live_lock:
+        queues = list(_live_subscribers.get(course_id, ()))
+    for q in queues:
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            # browser ตามไม่ทัน: snapshot ล่าสุดแทนของที่ค้างได้ทั้งหมด
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait(event)
+
+
+def live_snapshot(course_id):
+    """ข้อมูลกราฟ dashboard ปัจจุบันของ course
+
+    ค่าเฉลี่ย / histogram อ่านจาก course_stats (O(1)) ส่วน total รายคนอ่านจากคอลัมน์
+    ไม่คำนวณคะแนนรายคนใหม่ คืน None ถ้าไม่มี course
+    """
+    stats = get_course_stats(course_id)
+    if stats is None:
+        return None
+    conn = get_db(course_id)
+    rows = conn.execute(
+        "SELECT id, total FROM scores WHERE course=? AND user_id<> 'admin'",
+        (course_id,)
+    ).fetchall()
+    conn.close()
+    return {
+        "ids": [r[0] for r in rows],
+        "totals": [r[1] for r in rows],
+        "means": [stats[key]["mean"] for key in DASHBOARD_KEYS],
+        "hist": stats["total"]["hist"],
     }
 
 
+def _ensure_live_poller():
+    # เรียกโดยถือ _live_lock; start แบบ lazy และเช็ค pid เผื่อถูก fork (gunicorn --preload)
+    global _live_poller
+    if (_live_poller is None or _live_poller[0] != os.getpid()
+            or not _live_poller[1].is_alive()):
+        thread = threading.Thread(target=_live_poll_loop, name="live-poller", daemon=True)
+        _live_poller = (os.getpid(), thread)
+        thread.start()
+
+
+def _live_poll_loop():
+    while True:
+        time.sleep(LIVE_POLL_SECONDS)
+        with _live_lock:
+            course_ids = list(_live_subscribers)
+        for course_id in course_ids:
+            try:
+                _live_poll_course(course_id)
+            except Exception:
+                app.logger.exception("live dashboard poll failed for %s", course_id)
+
+
+def _live_poll_course(course_id):
+    try:
+        conn = get_db(course_id)
+    except CourseNotFound:
+        version = None
+    else:
+        version = get_course_version(conn, course_id)
+        conn.close()
+    with _live_lock:
+        last = _live_versions.get(course_id)
+        if course_id not in _live_subscribers or (last is not None and version == last):
+            return
+        _live_versions[course_id] = version
+
+    if version is None or (last is not None and version[0] != last[0]):
+        # ลบ course / แก้ค่าตั้ง (คะแนนเต็มเปลี่ยนช่อง histogram): ให้ browser โหลดใหม่
+        _live_publish(course_id, {"reload": True})
+        return
+    snapshot = live_snapshot(course_id)
+    _live_publish(course_id, snapshot if snapshot is not None else {"reload": True})
+
+
 # --------------------------------------------------------
 # AUTH / SESSION
 # --------------------------------------------------------
@@ -197,7 +1664,8 @@ def login():
     courses = cur.execute(
         "SELECT course, name FROM courses WHERE status='active' ORDER BY course"
     ).fetchall()
-    courses = [{"course": "All", "name": "System Admin"}] + [dict(c) for c in courses]
+    courses = [{"course": "All", "name": "System Admin"},
+               {"course": "*", "name": "All my courses"}] + [dict(c) for c in courses]
 
     if request.method == "POST":
         course = request.form.get("course")
@@ -205,14 +1673,26 @@ def login():
         password = request.form.get("password", "")
         password_confirm = request.form.get("password_confirm", "")
 
-        # หา row ของ user ใน course นั้น
+        # course ต้องอยู่ใน dropdown เท่านั้น (กันเปิด shard ของ course มั่ว)
+        if course not in {c["course"] for c in courses}:
+            conn.close()
+            flash("User not found for this course.", "danger")
+            return render_template("login.html", courses=courses)
+
+        conn.close()
+        if course == "*":
+            return _login_all_courses(user_id, password, password_confirm, courses)
+
+        # หา row ของ user ใน course นั้น (shard mode: อยู่คนละไฟล์กับ courses)
+        conn = get_db(course)
+        cur = conn.cursor()
         row = cur.execute(
             "SELECT * FROM scores WHERE course=? AND user_id=?",
             (course, user_id)
         ).fetchone()
+        conn.close()
 
         if row is None:
-            conn.close()
             flash("User not found for this course.", "danger")
             return render_template("login.html", courses=courses)
 
@@ -222,7 +1702,6 @@ def login():
         # ยกเว้น admin (All/admin) ยังเข้าได้ปกติ
         if not (course == "All" and user_id == "admin"):
             if row.get("status") == "suspend":
-                conn.close()
                 flash("Your status for this course is suspended. Please contact your instructor.", "danger")
                 return render_template("login.html", courses=courses)
 
@@ -233,23 +1712,24 @@ def login():
         if not row.get("password"):
             # ต้องกรอกทั้งสองช่อง
             if not password or not password_confirm:
-                conn.close()
                 flash("Please enter your new password twice to set it.", "warning")
                 return render_template("login.html", courses=courses)
 
             # ต้องตรงกัน
             if password != password_confirm:
-                conn.close()
                 flash("Passwords do not match. Please try again.", "danger")
                 return render_template("login.html", courses=courses)
 
-            # ตั้งรหัสใหม่
+            # ตั้งรหัสใหม่ (เฉพาะถ้ายังว่างอยู่: กันสอง request ตั้งทับกัน)
             hashed = generate_password_hash(password)
-            conn.execute(
-                "UPDATE scores SET password=? WHERE id=?",
+            updated = run_write(untracked_write(course, lambda c: c.execute(
+                "UPDATE scores SET password=? "
+                "WHERE id=? AND (password IS NULL OR password='')",
                 (hashed, row["id"])
-            )
-            conn.commit()
+            ).rowcount), course)
+            if not updated:
+                flash("Your password has just been set. Please log in with it.", "warning")
+                return render_template("login.html", courses=courses)
             # จากนั้นให้ถือว่า login สำเร็จต่อได้เลย
 
         else:
@@ -257,7 +1737,6 @@ def login():
             # เคยมี password แล้ว → ใช้ช่อง password ปกติ
             # -------------------------------
             if not password or not check_password_hash(row["password"], password):
-                conn.close()
                 flash("Invalid password.", "danger")
                 return render_template("login.html", courses=courses)
 
@@ -273,8 +1752,6 @@ def login():
         session["user_id"] = user_id
         session["fullname"] = row["fullname"]
 
-        conn.close()
-
         if session["role"] == "admin":
             return redirect(url_for("admin_home"))
         else:
@@ -285,6 +1762,53 @@ def login():
     return render_template("login.html", courses=courses)
 
 
+def _login_all_courses(user_id, password, password_confirm, courses):
+    """login ครั้งเดียวแล้วดูได้ทุก course ที่ลงทะเบียน
+
+    password ต้องตรงกับ course ใดก็ได้ของ user
+    ถ้ายังไม่เคยตั้ง password เลยสักวิชา -> ตั้งรหัสเดียวกันให้ทุกวิชา
+    """
+    enrolled = [
+        (row, course) for row, course in fetch_student_courses(user_id)
+        if row["status"] != "suspend"
+    ]
+    if not enrolled:
+        flash("User not found in any active course.", "danger")
+        return render_template("login.html", courses=courses)
+
+    hashes = [row["password"] for row, _ in enrolled if row.get("password")]
+    if not hashes:
+        if not password or not password_confirm:
+            flash("Please enter your new password twice to set it.", "warning")
+            return render_template("login.html", courses=courses)
+        if password != password_confirm:
+            flash("Passwords do not match. Please try again.", "danger")
+            return render_template("login.html", courses=courses)
+
+        hashed = generate_password_hash(password)
+        for row, course in enrolled:
+            run_write(untracked_write(
+                course["course"],
+                lambda c, row=row, course=course: c.execute(
+                    "UPDATE scores SET password=? "
+                    "WHERE id=? AND course=? AND (password IS NULL OR password='')",
+                    (hashed, row["id"], course["course"])
+                )
+            ), course["course"])
+
+    elif not password or not any(check_password_hash(h, password) for h in hashes):
+        flash("Invalid password.", "danger")
+        return render_template("login.html", courses=courses)
+
+    session.clear()
+    session["role"] = "student"
+    session["multi"] = True
+    session["course"] = enrolled[0][1]["course"]
+    session["user_id"] = user_id
+    session["fullname"] = enrolled[0][0]["fullname"]
+    return redirect(url_for("student_courses"))
+
+
 @app.route("/logout")
 def logout():
     session.clear()
@@ -300,18 +1824,45 @@ def require_admin():
     return True
 
 
+@app.errorhandler(CourseNotFound)
+def course_not_found(e):
+    flash("Course not found.", "danger")
+    return redirect(url_for("admin_home" if require_admin() else "login"))
+
+
 @app.route("/admin")
 def admin_home():
     if not require_admin():
         return redirect(url_for("login"))
 
-    conn = get_db()
-    courses = conn.execute(
-        "SELECT * FROM courses ORDER BY course"
-    ).fetchall()
-    conn.close()
+    return render_template(
+        "admin_home.html",
+        courses=course_overview(),
+        archived_courses=list_archived_courses(),
+    )
+
+@app.route("/admin/search")
+def admin_search():
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    q = request.args.get("q", "").strip()
+    results = search_students(q) if q else []
+    return render_template("admin_search.html", q=q, results=results)
+
+
+@app.route("/admin/cache")
+def admin_cache_stats():
+    """สถิติ cache ของ process นี้ (hit / miss / eviction) เป็น JSON"""
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    return jsonify(
+        budget={"used": cache_budget.used, "max_bytes": cache_budget.max_bytes},
+        fragments=fragment_cache.stats(),
+        scores=score_cache.stats(),
+    )
 
-    return render_template("admin_home.html", courses=courses)
 
 @app.route("/admin/change_password", methods=["GET", "POST"])
 def admin_change_password():
@@ -346,13 +1897,12 @@ def admin_change_password():
             return redirect(url_for("admin_change_password"))
 
         # บันทึก
+        conn.close()
         hashed = generate_password_hash(new_pw)
-        conn.execute(
+        run_write(lambda c: c.execute(
             "UPDATE scores SET password=? WHERE course='All' AND user_id='admin'",
             (hashed,)
-        )
-        conn.commit()
-        conn.close()
+        ))
 
         flash("Admin password updated successfully.", "success")
         return redirect(url_for("admin_home"))
@@ -387,9 +1937,8 @@ def admin_add_course():
         flash("Course ID and name are required.", "warning")
         return redirect(url_for("admin_home"))
 
-    conn = get_db()
     try:
-        conn.execute("""
+        run_write(lambda c: c.execute("""
             INSERT INTO courses
             (course, name, status,
              max_total, max_mid, max_final, max_class, max_lab, max_hw,
@@ -403,13 +1952,13 @@ def admin_add_course():
             max_total, max_mid, max_final, max_class, max_lab, max_hw,
             max_quiz, max_p1, max_p2,
             class_factor, lab_factor, hw_factor, quiz_factor
-        ))
-        conn.commit()
+        )))
+        if sharded():
+            # สร้างไฟล์ shard ของ course ใหม่ไว้เลย
+            get_db(course, create=True).close()
         flash("Course added.", "success")
     except sqlite3.IntegrityError:
         flash("Course ID already exists.", "danger")
-    finally:
-        conn.close()
 
     return redirect(url_for("admin_home"))
 
@@ -419,27 +1968,98 @@ def admin_toggle_course(course_id):
     if not require_admin():
         return redirect(url_for("login"))
 
+    # สลับสถานะใน UPDATE เดียว (ไม่อ่านก่อนแล้วค่อยเขียน)
+    updated = run_write(lambda c: c.execute(
+        "UPDATE courses SET status=CASE status WHEN 'suspend' THEN 'active' "
+        "ELSE 'suspend' END WHERE course=?",
+        (course_id,)
+    ).rowcount)
+    if not updated:
+        flash("Course not found.", "danger")
+        return redirect(url_for("admin_home"))
+    flash("Course status updated.", "success")
+    return redirect(url_for("admin_home"))
+
+
+@app.route("/admin/course/<course_id>/archive", methods=["POST"])
+def admin_archive_course(course_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+
     conn = get_db()
     row = conn.execute(
         "SELECT status FROM courses WHERE course=?",
         (course_id,)
     ).fetchone()
+    conn.close()
     if not row:
-        conn.close()
         flash("Course not found.", "danger")
         return redirect(url_for("admin_home"))
 
-    status = "active" if row["status"] == "suspend" else "suspend"
-    conn.execute(
-        "UPDATE courses SET status=? WHERE course=?",
-        (status, course_id)
-    )
-    conn.commit()
+    # archive ได้เฉพาะ course ที่ suspend แล้ว (นักศึกษา login ไม่ได้แล้ว)
+    if row["status"] != "suspend":
+        flash("Suspend the course before archiving it.", "warning")
+        return redirect(url_for("admin_home"))
+
+    archive_course(course_id, compress=request.form.get("compress") == "1")
+    flash("Course archived.", "success")
+    return redirect(url_for("admin_home"))
+
+
+@app.route("/admin/course/<course_id>/unarchive", methods=["POST"])
+def admin_unarchive_course(course_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    conn = get_db()
+    exists = conn.execute(
+        "SELECT 1 FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
     conn.close()
-    flash("Course status updated.", "success")
+    if exists:
+        flash("A live course with this ID already exists.", "danger")
+        return redirect(url_for("admin_home"))
+
+    if not any(c["course"] == course_id for c in list_archived_courses()):
+        flash("Archived course not found.", "danger")
+        return redirect(url_for("admin_home"))
+
+    unarchive_course(course_id)
+    flash("Course restored from archive.", "success")
     return redirect(url_for("admin_home"))
 
 
+@app.route("/admin/course/<course_id>/clone", methods=["POST"])
+def admin_clone_course(course_id):
+    """เปิดเทอมใหม่: copy course (และรายชื่อนักศึกษา) เป็น course ID ใหม่"""
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    new_id = request.form.get("new_course", "").strip()
+    name = request.form.get("name", "").strip()
+    roster = request.form.get("roster") == "1"
+    if not new_id or not name:
+        flash("New course ID and name are required.", "warning")
+        return redirect(url_for("admin_course", course_id=course_id))
+    if any(c["course"] == new_id for c in list_archived_courses()):
+        # ถ้าซ้ำกับ archive จะ unarchive course นั้นกลับมาไม่ได้
+        flash("An archived course with this ID already exists.", "danger")
+        return redirect(url_for("admin_course", course_id=course_id))
+
+    try:
+        copied = clone_course(course_id, new_id, name, roster)
+    except LookupError:
+        flash("Course not found.", "danger")
+        return redirect(url_for("admin_home"))
+    except sqlite3.IntegrityError:
+        flash("Course ID already exists.", "danger")
+        return redirect(url_for("admin_course", course_id=course_id))
+
+    flash(f"Course cloned ({copied} students copied)." if roster
+          else "Course cloned.", "success")
+    return redirect(url_for("admin_course", course_id=new_id))
+
+
 @app.route("/admin/course/<course_id>/edit", methods=["GET", "POST"])
 def admin_edit_course(course_id):
     if not require_admin():
@@ -470,69 +2090,235 @@ def admin_edit_course(course_id):
         max_p1 = float(request.form.get("max_p1") or 0)
         max_p2 = float(request.form.get("max_p2") or 0)
 
-        class_factor = float(request.form.get("class_factor") or 1)
-        lab_factor = float(request.form.get("lab_factor") or 1)
-        hw_factor = float(request.form.get("hw_factor") or 1)
-        quiz_factor = float(request.form.get("quiz_factor") or 1)
+        class_factor = float(request.form.get("class_factor") or 1)
+        lab_factor = float(request.form.get("lab_factor") or 1)
+        hw_factor = float(request.form.get("hw_factor") or 1)
+        quiz_factor = float(request.form.get("quiz_factor") or 1)
+
+        grade_cutoffs = request.form.get("grade_cutoffs", "").strip() or None
+        try:
+            parse_cutoffs(grade_cutoffs)
+        except ValueError:
+            conn.close()
+            flash("Invalid grade cutoffs. Use e.g. A:80, B+:75, B:70, F:0", "warning")
+            return redirect(url_for("admin_edit_course", course_id=course_id))
+
+        conn.close()
+        # ค่าที่มีผลต่อ total / course_stats (แก้แค่ชื่อ / status / เกณฑ์เกรด ไม่ต้องคำนวณใหม่)
+        limits = {
+            "max_total": max_total, "max_mid": max_mid, "max_final": max_final,
+            "max_class": max_class, "max_lab": max_lab, "max_hw": max_hw,
+            "max_quiz": max_quiz, "max_p1": max_p1, "max_p2": max_p2,
+            "class_factor": class_factor, "lab_factor": lab_factor,
+            "hw_factor": hw_factor, "quiz_factor": quiz_factor,
+        }
+
+        def update(w):
+            old = w.execute(
+                "SELECT * FROM courses WHERE course=?", (course_id,)
+            ).fetchone()
+            version = get_course_version(w, course_id)
+            w.execute("""
+                UPDATE courses
+                SET name=?, status=?,
+                    max_total=?, max_mid=?, max_final=?, max_class=?, max_lab=?, max_hw=?,
+                    max_quiz=?, max_p1=?, max_p2=?,
+                    class_factor=?, lab_factor=?, hw_factor=?, quiz_factor=?,
+                    grade_cutoffs=?, version=version + 1
+                WHERE course=?
+            """, (
+                name, status,
+                max_total, max_mid, max_final, max_class, max_lab, max_hw,
+                max_quiz, max_p1, max_p2,
+                class_factor, lab_factor, hw_factor, quiz_factor,
+                grade_cutoffs,
+                course_id
+            ))
+            if old is None or any(old[k] != v for k, v in limits.items()):
+                # factor ในแถว scores ต้องตรงกับ courses ทันที (generated total ใช้ค่านี้)
+                _sync_course_factors(w, course_id)
+                return True
+            # คะแนนไม่เปลี่ยน: แค่ประทับ version ใหม่ให้ course_stats ไม่ถือว่า stale
+            update_course_stats(w, course_id, version)
+            return False
+
+        if write_scores(course_id, update):
+            # factor / คะแนนเต็มใหม่ -> คำนวณ course_stats ใหม่ทั้ง course เป็น background job
+            job_id = job_runner.submit("recompute", course_id, _job_recompute, course_id)
+            flash(f"Course updated. Statistics are being recomputed (job #{job_id}).",
+                  "success")
+        else:
+            flash("Course updated.", "success")
+        return redirect(url_for("admin_home"))
+
+    course_dict = dict(course)
+    conn.close()
+    return render_template("admin_course_edit.html", course=course_dict)
+
+
+@app.route("/admin/course/<course_id>")
+def admin_course(course_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    # course ที่ archive แล้วยังเปิดดูได้ (อ่านอย่างเดียว)
+    conn, course_dict, archived = open_course_db(course_id)
+    if conn is None:
+        flash("Course not found.", "danger")
+        return redirect(url_for("admin_home"))
+
+    # filter / sort ทำใน SQLite ผ่าน generated column total
+    # (course ที่ archive แบบเก่าไม่มี total -> กรองไม่ได้ แสดงทั้งหมด)
+    try:
+        below = _float_arg("below")
+    except ValueError:
+        below = None
+    sort = request.args.get("sort", "user_id")
+    sql = "SELECT * FROM scores WHERE course=? AND user_id<>'admin'"
+    params = [course_id]
+    has_total = "total" in _table_columns(conn, "scores", "main", hidden=True)
+    if below is not None and has_total:
+        sql += " AND total < ?"
+        params.append(below)
+    if sort == "total" and has_total:
+        sql += " ORDER BY total DESC, user_id"
+    else:
+        sort = "user_id"
+        sql += " ORDER BY user_id"
+
+    # ทั้งตาราง cache ตาม course version: ไม่มีอะไรเปลี่ยน = ไม่ query / render ซ้ำ
+    version = None if archived else get_course_version(conn, course_id)
+    table_key = ("table", course_id, version, below, sort)
+    table_html = fragment_cache.get(table_key) if version else None
+    if table_html is None:
+        rows = conn.execute(sql, params).fetchall()
+        students = []
+        for r in rows:
+            s = {"row": r}
+            if has_total:
+                s["total"] = r["total"]
+            else:
+                s["scores"] = cached_scores(dict(r), course_dict)
+                s["total"] = s["scores"]["total"]
+            students.append(s)
+
+        if below is None:
+            # ใช้ total ของหน้านี้สร้าง ranking (ถ้า cache ยังไม่มี) ไม่ต้อง query ซ้ำ
+            ranking = get_course_ranking(
+                conn, course_dict,
+                totals=[s["total"] for s in students
+                        if s["row"]["status"] == "active"],
+            )
+        else:
+            ranking = get_course_ranking(conn, course_dict)
+        for s in students:
+            s["letter"] = ranking.letter(s["total"])
+
+        table_html = _render_student_table(course_dict, students, archived, version)
+        if version:
+            fragment_cache.set(table_key, table_html)
+    conn.close()
+
+    return render_template(
+        "admin_course.html",
+        course=course_dict,   # <-- แก้จาก course เป็น course_dict
+        table_html=Markup(table_html),
+        archived=archived,
+        below=below,
+        sort=sort,
+    )
+
+
+def _render_student_table(course_dict, students, archived, version):
+    """render ตารางนักศึกษา โดย render ใหม่เฉพาะแถวที่ row version เปลี่ยน
+
+    key ของแถว = (course, id, row version, เกรด, config version)
+    version = None (archive) -> ไม่ cache
+    """
+    row_template = app.jinja_env.get_template("admin_course_row.html")
+    course_id = course_dict["course"]
+    for s in students:
+        r = s["row"]
+        key = None
+        if version:
+            key = ("row", course_id, r["id"], r["version"], s["letter"], version[0])
+            html = fragment_cache.get(key)
+            if html is not None:
+                s["html"] = Markup(html)
+                continue
+        if "scores" not in s:
+            s["scores"] = cached_scores(dict(r), course_dict)
+        html = row_template.render(course=course_dict, s=s, archived=archived)
+        if key:
+            fragment_cache.set(key, html)
+        s["html"] = Markup(html)
+
+    return app.jinja_env.get_template("admin_course_table.html").render(
+        course=course_dict, students=students, archived=archived,
+    )
+
+
+@app.route("/admin/course/<course_id>/leaderboard")
+def admin_leaderboard(course_id):
+    """top-N / bottom-N ต่อหมวด (?category=total&n=20&order=top|bottom&format=json)"""
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    category = request.args.get("category", "total")
+    if category not in LEADERBOARD_CATEGORIES:
+        category = "total"
+    order = "bottom" if request.args.get("order") == "bottom" else "top"
+    try:
+        limit = min(max(int(request.args.get("n", 20)), 1), 500)
+    except ValueError:
+        limit = 20
 
-        conn.execute("""
-            UPDATE courses
-            SET name=?, status=?,
-                max_total=?, max_mid=?, max_final=?, max_class=?, max_lab=?, max_hw=?,
-                max_quiz=?, max_p1=?, max_p2=?,
-                class_factor=?, lab_factor=?, hw_factor=?, quiz_factor=?
-            WHERE course=?
-        """, (
-            name, status,
-            max_total, max_mid, max_final, max_class, max_lab, max_hw,
-            max_quiz, max_p1, max_p2,
-            class_factor, lab_factor, hw_factor, quiz_factor,
-            course_id
-        ))
-        conn.commit()
-        conn.close()
-        flash("Course updated.", "success")
+    conn, course_dict, archived = open_course_db(course_id)
+    if conn is None or archived:
+        if conn is not None:
+            conn.close()
+        flash("Course not found." if conn is None else "Archived courses have no leaderboard.",
+              "danger")
         return redirect(url_for("admin_home"))
-
-    course_dict = dict(course)
+    count, students = leaderboard(conn, course_id, category, limit, order == "bottom")
     conn.close()
-    return render_template("admin_course_edit.html", course=course_dict)
+
+    if request.args.get("format") == "json":
+        return jsonify(course=course_id, category=category, order=order,
+                       count=count, students=students)
+    return render_template(
+        "admin_leaderboard.html",
+        course=course_dict,
+        categories=list(LEADERBOARD_CATEGORIES),
+        category=category,
+        order=order,
+        limit=limit,
+        count=count,
+        students=students,
+    )
 
 
-@app.route("/admin/course/<course_id>")
-def admin_course(course_id):
+@app.route("/admin/course/<course_id>/validate")
+def admin_validate_course(course_id):
+    """รายการคะแนนที่ผิดปกติทั้ง course (ติดลบ / เกินคะแนนเต็ม / factor ไม่ตรง)"""
     if not require_admin():
         return redirect(url_for("login"))
 
-    conn = get_db()
-    course = conn.execute(
-        "SELECT * FROM courses WHERE course=?",
-        (course_id,),
-    ).fetchone()
-    if not course:
-        conn.close()
-        flash("Course not found.", "danger")
+    conn, course_dict, archived = open_course_db(course_id)
+    if conn is None or archived:
+        if conn is not None:
+            conn.close()
+        flash("Course not found." if conn is None else "Archived courses are read-only.",
+              "danger")
         return redirect(url_for("admin_home"))
-
-    rows = conn.execute(
-        "SELECT * FROM scores WHERE course=? AND user_id<>'admin' ORDER BY user_id",
-        (course_id,),
-    ).fetchall()
+    violations = validate_course(conn, course_dict)
     conn.close()
 
-    # แปลงเป็น dict ก่อนใช้ทั้งใน compute_scores และ template
-    course_dict = dict(course)
-
-    students = []
-    for r in rows:
-        rd = dict(r)
-        sc = compute_scores(rd, course_dict)
-        students.append({"row": r, "scores": sc})
-
     return render_template(
-        "admin_course.html",
-        course=course_dict,   # <-- แก้จาก course เป็น course_dict
-        students=students,
+        "admin_validate.html",
+        course=course_dict,
+        violations=violations,
+        rules=VALIDATION_RULES,
     )
 
 
@@ -541,94 +2327,240 @@ def admin_dashboard(course_id):
     if session.get("role") != "admin":
         return redirect(url_for("login"))
 
-    conn = get_db()
-
-    course = conn.execute(
-        "SELECT * FROM courses WHERE course=?", (course_id,)
-    ).fetchone()
-
-    rows = conn.execute(
-        "SELECT * FROM scores WHERE course=? AND user_id<> 'admin'",
-        (course_id,)
-    ).fetchall()
-
-    conn.close()
-
-    if not course:
+    conn, course_dict, archived = open_course_db(course_id)
+    if conn is None:
         flash("Course not found.", "danger")
         return redirect(url_for("admin_home"))
 
-    # คำนวณคะแนน
-    course_dict = dict(course)
-    students = []
-    totals = []
-    mids = []
-    finals = []
-    p1s = []
-    p2s = []
-    class_scores = []
-    hw_scores = []
-    quiz_scores = []
-    lab_scores = []
-
-    for r in rows:
-        rd = dict(r)
-        sc = compute_scores(rd, course_dict)
-        students.append(sc)
-
-        totals.append(sc["total"])
-        mids.append(sc["mid_term"])
-        finals.append(sc["final"])
-        p1s.append(sc["project1"])
-        p2s.append(sc["project2"])
-        class_scores.append(sc["class_score"])
-        hw_scores.append(sc["homework_score"])
-        quiz_scores.append(sc["quiz_score"])
-        lab_scores.append(sc["lab_score"])
+    if archived:
+        # archive: ไม่มี course_stats -> คำนวณจากทุกแถว (อ่านอย่างเดียว)
+        rows = conn.execute(
+            "SELECT * FROM scores WHERE course=? AND user_id<> 'admin'",
+            (course_id,)
+        ).fetchall()
+        conn.close()
+        ids = [r["id"] for r in rows]
+        score_list = [cached_scores(dict(r), course_dict) for r in rows]
+        totals = [sc["total"] for sc in score_list]
+        stats = stats_from_values(
+            course_dict,
+            [tuple(sc[key] for key, _ in STATS_SQL) for sc in score_list],
+        )
+        stats = {key: st.summary() for key, st in stats.items()}
+    else:
+        # สถิติทุกหมวดอ่านจาก course_stats (O(1)) เหลือแค่ total รายคนสำหรับกราฟแท่ง
+        rows = conn.execute(
+            "SELECT id, total FROM scores WHERE course=? AND user_id<> 'admin'",
+            (course_id,)
+        ).fetchall()
+        conn.close()
+        ids = [r[0] for r in rows]
+        totals = [r[1] for r in rows]
+        stats = get_course_stats(course_id)
 
     # ส่งค่าไปให้ Chart.js
     return render_template(
         "admin_dashboard.html",
         course=course_dict,
         totals=totals,
-        mids=mids,
-        finals=finals,
-        p1s=p1s,
-        p2s=p2s,
-        class_scores=class_scores,
-        hw_scores=hw_scores,
-        quiz_scores=quiz_scores,
-        lab_scores=lab_scores
+        ids=ids,
+        stats=stats,
+        keys=DASHBOARD_KEYS,
+        means=[stats[key]["mean"] for key in DASHBOARD_KEYS],
+        hist=stats["total"]["hist"],
+        live=not archived,
     )
 
+
+@app.route("/admin/dashboard/<course_id>/stream")
+def admin_dashboard_stream(course_id):
+    """SSE: ส่ง snapshot ของ dashboard ทุกครั้งที่ course version เปลี่ยน (ดู _live_poll_course)
+
+    แต่ละ browser ถือ connection ค้างไว้ 1 thread (dev server / gunicorn --threads
+    / stream pool ของ asgi.py) ไม่ควรใช้กับ gunicorn sync worker
+    """
+    if session.get("role") != "admin":
+        return Response(status=403)
+
+    q = live_subscribe(course_id)
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            # ตอน (re)connect: ส่งสถานะปัจจุบันก่อน เผื่อพลาดการแก้ไขระหว่างโหลดหน้า / หลุด
+            snapshot = live_snapshot(course_id)
+            yield f"data: {json.dumps(snapshot or {'reload': True})}\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=LIVE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            live_unsubscribe(course_id, q)
+
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",     # nginx: อย่า buffer stream
+    })
+
 @app.route("/student/dashboard")
 def student_dashboard():
+    """หน้าเปล่า (shell) ที่ไม่แตะ session -> browser / proxy cache ได้ทุกคนใช้ร่วมกัน
+
+    ข้อมูลของนักศึกษาโหลดด้วย JS จาก student_dashboard_data
+    """
+    resp = app.make_response(render_template("student_dashboard.html", static_page=True))
+    resp.cache_control.public = True
+    resp.cache_control.max_age = DASHBOARD_SHELL_MAX_AGE
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+@app.route("/student/dashboard/data")
+def student_dashboard_data():
+    """คะแนนแต่ละหมวด + คะแนนเต็มของ course สำหรับกราฟ (JSON เล็ก ๆ)
+
+    ETag = row version + config version ของ course: ไม่มีอะไรเปลี่ยน -> 304
+    """
     if session.get("role") != "student":
-        return redirect(url_for("login"))
+        return jsonify(error="login required", login=url_for("login")), 401
 
     course_id = session["course"]
-    user_id = session["user_id"]
-
-    conn = get_db()
-    student = conn.execute(
-        "SELECT * FROM scores WHERE course=? AND user_id=?",
-        (course_id, user_id)
+    conn = get_db(course_id)
+    row = conn.execute(
+        f"SELECT id, version, user_id, fullname, {_SUMMARY_SELECT}, "
+        f"{', '.join(QUIZ_KEYS)} FROM scores WHERE course=? AND user_id=?",
+        (course_id, session["user_id"])
     ).fetchone()
-
     course = conn.execute(
-        "SELECT * FROM courses WHERE course=?",
+        "SELECT course, name, version, max_total, max_mid, max_final, max_p1, max_p2, "
+        "max_hw, max_quiz, max_lab, max_class FROM courses WHERE course=?",
         (course_id,)
     ).fetchone()
+    conn.close()
+    if row is None or course is None:
+        return jsonify(error="not found"), 404
+
+    course = dict(course)
+    resp = jsonify(
+        user_id=row["user_id"],
+        fullname=row["fullname"],
+        course={"course": course["course"], "name": course["name"]},
+        scores={key: row[key] for key, _ in SUMMARY_SQL},
+        max={key: course[col] or 0 for key, col in CURVE_CATEGORIES + (("total", "max_total"),)},
+        quiz=[row[k] or 0 for k in QUIZ_KEYS],
+    )
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.set_etag(hashlib.sha1(
+        f"{course_id}\0{row['id']}\0{row['version']}\0{course['version']}".encode("utf-8")
+    ).hexdigest()[:16])
+    return resp.make_conditional(request)
+
+
+# --------------------------------------------------------
+# ADMIN – GRADE CURVE
+# --------------------------------------------------------
+# หมวดที่เป็นผลรวมของหลายช่อง: ตอน apply ให้คูณทุกช่องด้วยอัตราเดียวกัน
+_CURVE_ITEMS = {
+    "homework_score": ("hw", HW_COUNT),
+    "quiz_score": ("quiz", QUIZ_COUNT),
+    "lab_score": ("lab", LAB_COUNT),
+    "class_score": ("class", CLASS_COUNT),
+}
+
+
+def _curved_columns(row, old_sc, new_sc):
+    """คะแนนหมวดใหม่ -> ค่าคอลัมน์ใน scores ที่ต้อง UPDATE"""
+    cols = {}
+    for cat in ("mid_term", "final", "project1", "project2"):
+        if new_sc[cat] != old_sc[cat]:
+            cols[cat] = new_sc[cat]
+    for cat, (prefix, count) in _CURVE_ITEMS.items():
+        if old_sc[cat] > 0 and new_sc[cat] != old_sc[cat]:
+            k = new_sc[cat] / old_sc[cat]
+            for i in range(1, count + 1):
+                cols[f"{prefix}_{i}"] = (row.get(f"{prefix}_{i}") or 0) * k
+    return cols
+
+
+def _float_arg(name):
+    value = request.values.get(name, "").strip()
+    return float(value) if value else None
+
+
+@app.route("/admin/course/<course_id>/curve", methods=["GET", "POST"])
+def admin_curve(course_id):
+    """preview curve ของทั้ง course แล้วค่อย apply (POST)"""
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    conn = get_db()
+    course = conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
+    conn.close()
+    if not course:
+        flash("Course not found.", "danger")
+        return redirect(url_for("admin_home"))
+    course_dict = dict(course)
 
+    method = request.values.get("method", "")
+    try:
+        target_mean = _float_arg("target_mean")
+        target_std = _float_arg("target_std")
+    except ValueError:
+        flash("Target mean / std must be numbers.", "warning")
+        return redirect(url_for("admin_curve", course_id=course_id))
+
+    conn = get_db(course_id)
+    version = get_course_version(conn, course_id)
+    rows = fetch_dicts(
+        conn,
+        "SELECT * FROM scores "
+        "WHERE course=? AND user_id<>'admin' AND status='active' ORDER BY user_id",
+        (course_id,)
+    )
     conn.close()
 
-    sc = compute_scores(dict(student), dict(course))
+    if method not in CURVE_METHODS:
+        return render_template("admin_curve.html", course=course_dict,
+                               result=None, rows=rows, method="linear")
+
+    score_list = [compute_scores(r, course_dict) for r in rows]
+    result = curve_course(score_list, course_dict, method,
+                          target_mean=target_mean, target_std=target_std)
+
+    if request.method == "POST":
+        # ข้อมูลเปลี่ยนระหว่าง preview กับ apply -> ให้ดู preview ใหม่ก่อน
+        if request.form.get("version") != repr(version):
+            flash("Scores changed since the preview. Please review it again.", "warning")
+            return redirect(url_for("admin_curve", course_id=course_id, method=method,
+                                    target_mean=request.form.get("target_mean", ""),
+                                    target_std=request.form.get("target_std", "")))
+
+        updates = []
+        for row, old_sc, new_sc in zip(rows, score_list, result["new"]):
+            cols = _curved_columns(row, old_sc, new_sc)
+            if cols:
+                updates.append((row["id"], cols))
+
+        job_id = job_runner.submit("curve", course_id, _job_apply_curve,
+                                   course_id, version, updates)
+        flash(f"Applying curve to {len(updates)} students (job #{job_id}).", "info")
+        return redirect(url_for("admin_job", job_id=job_id))
 
     return render_template(
-        "student_dashboard.html",
-        course=dict(course),
-        scores=sc,
-        student=dict(student)
+        "admin_curve.html",
+        course=course_dict,
+        rows=rows,
+        method=method,
+        target_mean=target_mean,
+        target_std=target_std,
+        result=result,
+        version=repr(version),
     )
 
 
@@ -681,6 +2613,19 @@ def parse_scores(text, max_count):
 
     return nums[:max_count]
 
+# คอลัมน์ที่ฟอร์ม edit แก้ได้ (ไม่รวม id / course / password)
+EDITABLE_COLUMNS = [
+    c for c in SCORE_COLUMNS if c not in ("id", "course", "password")
+]
+
+
+def _same_value(old, new):
+    """เทียบค่าเดิมกับค่าจากฟอร์ม (NULL ถือว่าเท่ากับ 0 สำหรับคะแนน)"""
+    if isinstance(new, float):
+        return (old or 0.0) == new
+    return old == new
+
+
 def _read_student_from_form(existing=None):
     """อ่านข้อมูลจาก form (ใช้ทั้ง add และ edit)"""
     data = existing.copy() if existing else {}
@@ -722,7 +2667,7 @@ def admin_add_student(course_id):
     if session.get("role") != "admin":
         return redirect(url_for("login"))
 
-    conn = get_db()
+    conn = get_db(course_id)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 
@@ -734,6 +2679,18 @@ def admin_add_student(course_id):
             flash("User ID and Full name are required.", "warning")
             return redirect(url_for("admin_add_student", course_id=course_id))
 
+        course = cur.execute(
+            "SELECT * FROM courses WHERE course = ?", (course_id,)
+        ).fetchone()
+        if not course:
+            conn.close()
+            flash("Course not found.", "danger")
+            return redirect(url_for("admin_home"))
+
+        # factor ในแถวต้องตรงกับ course (ใช้ใน generated column total)
+        for f in FACTOR_COLUMNS:
+            data[f] = course[f]
+
         # เตรียม column / value สำหรับ INSERT
         columns = [
             "course", "user_id", "fullname", "password", "status",
@@ -772,9 +2729,15 @@ def admin_add_student(course_id):
 
         placeholders = ", ".join(["?"] * len(columns))
         sql = f"INSERT INTO scores ({', '.join(columns)}) VALUES ({placeholders})"
-        cur.execute(sql, values)
-        conn.commit()
         conn.close()
+        def insert(w):
+            new_id = w.execute(sql, values).lastrowid
+            _enroll(w, course_id, data["user_id"])
+            return new_id
+
+        new_id = write_scores(course_id, tracked_write(course_id, None, insert))
+        notify_score_change(course_id, new_id, SCORE_CATEGORIES + ("profile",),
+                            new=dict(zip(columns, values)))
 
         flash("Student added.", "success")
         return redirect(url_for("admin_course", course_id=course_id))
@@ -801,25 +2764,25 @@ def admin_add_student(course_id):
 
 
 
-@app.route("/admin/student/<int:student_id>/edit", methods=["GET", "POST"])
-def admin_edit_student(student_id):
+@app.route("/admin/course/<course_id>/student/<int:student_id>/edit",
+           methods=["GET", "POST"])
+def admin_edit_student(course_id, student_id):
     if session.get("role") != "admin":
         return redirect(url_for("login"))
 
-    conn = get_db()
+    conn = get_db(course_id)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 
+    # id ไม่ unique ข้าม shard -> ต้องเช็ค course ด้วย
     student = cur.execute(
-        "SELECT * FROM scores WHERE id = ?", (student_id,)
+        "SELECT * FROM scores WHERE id = ? AND course = ?", (student_id, course_id)
     ).fetchone()
     if not student:
         conn.close()
         flash("Student not found.", "danger")
         return redirect(url_for("admin_home"))
 
-    course_id = student["course"]
-
     if request.method == "POST":
         data = _read_student_from_form(existing=dict(student))
 
@@ -827,55 +2790,34 @@ def admin_edit_student(student_id):
         if not data["fullname"]:
             conn.close()
             flash("Full name is required.", "warning")
-            return redirect(url_for("admin_edit_student", student_id=student_id))
-
-        set_clauses = [
-            "user_id = ?",
-            "fullname = ?",
-            "status = ?",
-            "mid_term = ?",
-            "final = ?",
-            "project1 = ?",
-            "project2 = ?",
-            "class_factor = ?",
-            "lab_factor = ?",
-            "hw_factor = ?",
-            "quiz_factor = ?",
-        ]
-        values = [
-            data["user_id"],
-            data["fullname"],
-            data["status"],
-            data["mid_term"],
-            data["final"],
-            data["project1"],
-            data["project2"],
-            data["class_factor"],
-            data["lab_factor"],
-            data["hw_factor"],
-            data["quiz_factor"],
-        ]
+            return redirect(url_for("admin_edit_student",
+                                    course_id=course_id, student_id=student_id))
+
+        # UPDATE เฉพาะคอลัมน์ที่เปลี่ยนจริง
+        old = dict(student)
+        changes = {
+            col: data[col] for col in EDITABLE_COLUMNS
+            if not _same_value(old[col], data[col])
+        }
+        conn.close()
 
-        # เพิ่ม class_1.., lab_1.., hw_1.., quiz_1..
-        for i in range(1, CLASS_COUNT + 1):
-            set_clauses.append(f"class_{i} = ?")
-            values.append(data[f"class_{i}"])
-        for i in range(1, LAB_COUNT + 1):
-            set_clauses.append(f"lab_{i} = ?")
-            values.append(data[f"lab_{i}"])
-        for i in range(1, HW_COUNT + 1):
-            set_clauses.append(f"hw_{i} = ?")
-            values.append(data[f"hw_{i}"])
-        for i in range(1, QUIZ_COUNT + 1):
-            set_clauses.append(f"quiz_{i} = ?")
-            values.append(data[f"quiz_{i}"])
+        if not changes:
+            flash("No changes to save.", "info")
+            return redirect(url_for("admin_course", course_id=course_id))
 
+        set_clauses = [f"{col} = ?" for col in changes]
+        values = list(changes.values()) + [student_id]
         sql = f"UPDATE scores SET {', '.join(set_clauses)} WHERE id = ?"
-        values.append(student_id)
+        def update(w):
+            w.execute(sql, values)
+            if "user_id" in changes:
+                _unenroll(w, course_id, old["user_id"])
+                _enroll(w, course_id, changes["user_id"])
 
-        cur.execute(sql, values)
-        conn.commit()
-        conn.close()
+        write_scores(course_id, tracked_write(course_id, student_id, update))
+        notify_score_change(course_id, student_id,
+                            {column_category(col) for col in changes},
+                            old=old, new=data)
 
         flash("Student updated.", "success")
         return redirect(url_for("admin_course", course_id=course_id))
@@ -893,18 +2835,19 @@ def admin_edit_student(student_id):
         QUIZ_COUNT=QUIZ_COUNT,
     )
 
-@app.route("/admin/student/<int:student_id>/reset_password", methods=["POST"])
-def admin_reset_student_password(student_id):
+@app.route("/admin/course/<course_id>/student/<int:student_id>/reset_password",
+           methods=["POST"])
+def admin_reset_student_password(course_id, student_id):
     if not require_admin():
         return redirect(url_for("login"))
 
-    conn = get_db()
+    conn = get_db(course_id)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 
     row = cur.execute(
-        "SELECT course, user_id, fullname FROM scores WHERE id=?",
-        (student_id,)
+        "SELECT course, user_id, fullname FROM scores WHERE id=? AND course=?",
+        (student_id, course_id)
     ).fetchone()
 
     if not row:
@@ -912,47 +2855,393 @@ def admin_reset_student_password(student_id):
         flash("Student not found.", "danger")
         return redirect(url_for("admin_home"))
 
-    course_id = row["course"]
+    conn.close()
 
     # เคลียร์ password (ให้เป็นค่าว่าง)
-    cur.execute(
+    run_write(untracked_write(course_id, lambda c: c.execute(
         "UPDATE scores SET password=NULL WHERE id=?",
         (student_id,)
-    )
-    conn.commit()
-    conn.close()
+    )), course_id)
 
     flash(f"Password for {row['user_id']} - {row['fullname']} has been reset. "
           f"The student must set a new password on next login.", "success")
     return redirect(url_for("admin_course", course_id=course_id))
 
 
-@app.route("/admin/student/delete/<int:student_id>", methods=["POST"])
-def admin_delete_student(student_id):
+@app.route("/admin/course/<course_id>/student/<int:student_id>/delete",
+           methods=["POST"])
+def admin_delete_student(course_id, student_id):
     if not require_admin():
         return redirect(url_for("login"))
 
-    conn = get_db()
+    conn = get_db(course_id)
     row = conn.execute(
-        "SELECT course FROM scores WHERE id=?",
-        (student_id,)
+        "SELECT * FROM scores WHERE id=? AND course=?",
+        (student_id, course_id)
     ).fetchone()
     if not row:
         conn.close()
         flash("Student not found.", "danger")
         return redirect(url_for("admin_home"))
 
-    course_id = row["course"]
-    conn.execute("DELETE FROM scores WHERE id=?", (student_id,))
-    conn.commit()
+    old = dict(row)
     conn.close()
+    def delete(w):
+        w.execute("DELETE FROM scores WHERE id=?", (student_id,))
+        _unenroll(w, course_id, old["user_id"])
+
+    write_scores(course_id, tracked_write(course_id, student_id, delete))
+    notify_score_change(course_id, student_id, SCORE_CATEGORIES + ("profile",),
+                        old=old)
     flash("Student deleted.", "success")
     return redirect(url_for("admin_course", course_id=course_id))
 
 
+BULK_ACTIONS = ("suspend", "activate", "reset_password", "delete")
+
+
+@app.route("/admin/course/<course_id>/students/bulk", methods=["POST"])
+def admin_bulk_students(course_id):
+    """ทำ action เดียวกับนักศึกษาที่เลือกหลายคน: statement เดียว transaction เดียว"""
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    action = request.form.get("action", "")
+    ids = sorted({int(i) for i in request.form.getlist("ids") if i.isdigit()})
+    back = url_for("admin_course", course_id=course_id,
+                   **{k: v for k in ("below", "sort")
+                      if (v := request.form.get(k))})
+    if action not in BULK_ACTIONS:
+        flash("Unknown bulk action.", "danger")
+        return redirect(back)
+    if not ids:
+        flash("No students selected.", "warning")
+        return redirect(back)
+
+    # id ทั้งหมดส่งเป็น JSON array พารามิเตอร์เดียว (ไม่ติดขีดจำกัดจำนวน ?)
+    where = ("course = ? AND user_id <> 'admin' "
+             "AND id IN (SELECT value FROM json_each(?))")
+    params = (course_id, json.dumps(ids))
+
+    def apply(w):
+        version = get_course_version(w, course_id)
+        if action == "delete":
+            olds = w.execute(
+                f"SELECT user_id, {_STATS_SELECT} FROM main.scores WHERE {where}",
+                params
+            ).fetchall()
+            n = w.execute(f"DELETE FROM main.scores WHERE {where}", params).rowcount
+            for row in olds:
+                _unenroll(w, course_id, row[0])
+            update_course_stats(w, course_id, version,
+                                olds=[tuple(row)[1:] for row in olds])
+            return n
+
+        if action == "reset_password":
+            sql = f"UPDATE main.scores SET password = NULL WHERE {where}"
+            args = params
+        else:
+            status = "suspend" if action == "suspend" else "active"
+            sql = (f"UPDATE main.scores SET status = ? "
+                   f"WHERE {where} AND status <> ?")
+            args = (status,) + params + (status,)
+        n = w.execute(sql, args).rowcount
+        # คะแนนไม่เปลี่ยน: แค่ประทับ version ใหม่ให้ course_stats ไม่ถือว่า stale
+        update_course_stats(w, course_id, version)
+        return n
+
+    n = write_scores(course_id, apply)
+    if action == "delete":
+        notify_score_change(course_id, None, SCORE_CATEGORIES + ("profile",))
+    else:
+        notify_score_change(course_id, None, ("profile",))
+
+    labels = {"suspend": "suspended", "activate": "activated",
+              "reset_password": "password reset", "delete": "deleted"}
+    flash(f"{n} student(s) {labels[action]}.", "success")
+    return redirect(back)
+
+
+# --------------------------------------------------------
+# ADMIN – BACKGROUND JOBS
+# --------------------------------------------------------
+# คอลัมน์ของไฟล์ CSV (import / export) : factor เป็นของ course ไม่อยู่ในไฟล์
+CSV_COLUMNS = [c for c in EDITABLE_COLUMNS if c not in FACTOR_COLUMNS]
+CSV_SCORE_COLUMNS = CSV_COLUMNS[CSV_COLUMNS.index("mid_term"):]
+IMPORT_CHUNK = 500      # แถวต่อ transaction ตอน import
+
+
+def _job_recompute(job, course_id):
+    """คำนวณ course_stats ใหม่หลังแก้ factor / คะแนนเต็ม (factor sync ไปแล้วตอนแก้ course)"""
+    write_scores(course_id, lambda w: rebuild_course_stats(w, course_id))
+    notify_score_change(course_id, None, SCORE_CATEGORIES)
+    return "Statistics recomputed."
+
+
+def _job_apply_curve(job, course_id, version, updates):
+    def apply(w):
+        # preview ถูกคิดจากข้อมูล version นี้ ถ้ามีคนแก้ระหว่างรอคิว -> ไม่ apply
+        if get_course_version(w, course_id) != version:
+            raise ValueError("Scores changed since the preview; curve not applied.")
+        for student_id, cols in updates:
+            w.execute(
+                f"UPDATE scores SET {', '.join(f'{c} = ?' for c in cols)} "
+                f"WHERE id = ?",
+                list(cols.values()) + [student_id]
+            )
+        rebuild_course_stats(w, course_id)
+
+    job.progress(0, "Writing curved scores")
+    write_scores(course_id, apply)
+    notify_score_change(course_id, None, SCORE_CATEGORIES)
+    return f"Curve applied to {len(updates)} students."
+
+
+def _job_export_csv(job, course_id):
+    conn = get_db(course_id)
+    course = dict(conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone())
+    rows = fetch_dicts(
+        conn,
+        "SELECT * FROM scores WHERE course=? AND user_id<>'admin' ORDER BY user_id",
+        (course_id,)
+    )
+    ranking = get_course_ranking(conn, course)
+    conn.close()
+
+    name = os.path.basename(shard_path(course_id))[:-len(".db")] + ".csv"
+    # utf-8-sig: เปิดใน Excel แล้วชื่อภาษาไทยไม่เพี้ยน
+    with open(job.result_path(name), "w", newline="", encoding="utf-8-sig") as f:
+        out = csv.writer(f)
+        out.writerow(CSV_COLUMNS + ["total", "grade"])
+        for i, r in enumerate(rows):
+            if i % 200 == 0:
+                job.progress(100.0 * i / len(rows), f"{i}/{len(rows)} students")
+            out.writerow([r[c] for c in CSV_COLUMNS]
+                         + [round(r["total"], 2), ranking.letter(r["total"])])
+    return f"Exported {len(rows)} students."
+
+
+def _parse_import_row(line_no, rec):
+    row = {c: (rec.get(c) or "").strip() for c in CSV_COLUMNS if c in rec}
+    if not row.get("user_id") or not row.get("fullname"):
+        raise ValueError(f"line {line_no}: user_id and fullname are required")
+    if row.get("status", "") not in ("active", "suspend"):
+        row["status"] = "active"
+    for c in CSV_SCORE_COLUMNS:
+        if c in row:
+            try:
+                row[c] = float(row[c]) if row[c] else None
+            except ValueError:
+                raise ValueError(f"line {line_no}: {c} is not a number: {row[c]!r}")
+    return row
+
+
+def _job_import_csv(job, course_id, path):
+    """upsert นักศึกษาจาก CSV (key = user_id) ทีละ IMPORT_CHUNK แถวต่อ transaction
+
+    ตรวจทั้งไฟล์ก่อนเขียน: ไฟล์ผิดรูปแบบจะไม่มีอะไรถูก import
+    ยกเลิกกลางทาง: chunk ที่ commit ไปแล้วยังอยู่
+    """
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            header = [c for c in CSV_COLUMNS if c in (reader.fieldnames or [])]
+            if "user_id" not in header or "fullname" not in header:
+                raise ValueError("CSV header must contain user_id and fullname")
+            rows = [_parse_import_row(i, rec) for i, rec in enumerate(reader, start=2)]
+    finally:
+        os.remove(path)
+    if not rows:
+        return "No rows to import."
+
+    conn = get_db(course_id)
+    course = conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone()
+    conn.close()
+    if course is None:
+        raise ValueError(f"course {course_id!r} not found")
+
+    # ไฟล์ไม่มีคอลัมน์ status: แถวใหม่เป็น active แถวเดิมคง status เดิม
+    updates = [c for c in header if c != "user_id"] + list(FACTOR_COLUMNS)
+    if "status" not in header:
+        header.append("status")
+    columns = ["course"] + header + list(FACTOR_COLUMNS)
+    sql = (
+        f"INSERT INTO scores ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT(course, user_id) DO UPDATE SET "
+        + ", ".join(f"{c} = excluded.{c}" for c in updates)
+    )
+    factors = [course[f] for f in FACTOR_COLUMNS]
+
+    for start in range(0, len(rows), IMPORT_CHUNK):
+        job.progress(100.0 * start / len(rows), f"{start}/{len(rows)} students")
+        chunk = rows[start:start + IMPORT_CHUNK]
+
+        def upsert(w, chunk=chunk):
+            w.executemany(sql, [
+                [course_id] + [r.get(c) for c in header] + factors for r in chunk
+            ])
+            for r in chunk:
+                _enroll(w, course_id, r["user_id"])
+
+        write_scores(course_id, upsert)
+
+    write_scores(course_id, lambda w: rebuild_course_stats(w, course_id))
+    notify_score_change(course_id, None, SCORE_CATEGORIES + ("profile",))
+
+    # ตรวจเฉพาะแถวที่ import: มีค่าผิดปกติ -> แนบรายงานให้ดาวน์โหลด
+    conn = get_db(course_id)
+    violations = validate_course(conn, dict(course), [r["user_id"] for r in rows])
+    conn.close()
+    if not violations:
+        return f"Imported {len(rows)} students."
+    with open(job.result_path("violations.csv"), "w", newline="",
+              encoding="utf-8-sig") as f:
+        out = csv.writer(f)
+        out.writerow(["user_id", "fullname", "column", "problem", "value", "limit"])
+        for v in violations:
+            out.writerow([v["user_id"], v["fullname"], v["column"],
+                          VALIDATION_RULES[v["rule"]], v["value"], v["limit"]])
+    return (f"Imported {len(rows)} students; {len(violations)} score problems found "
+            f"(download the report).")
+
+
+def _job_report_cards(job, course_id):
+    conn = get_db(course_id)
+    course = dict(conn.execute(
+        "SELECT * FROM courses WHERE course=?", (course_id,)
+    ).fetchone())
+    conn.close()
+
+    name = os.path.basename(shard_path(course_id))[:-len(".db")] + "-report-cards.zip"
+    n = generate_report_cards(
+        db_path(course_id), course,
+        zip_file=job.result_path(name), workers=REPORT_WORKERS,
+        progress=lambda done, total: job.progress(100.0 * done / total,
+                                                  f"{done}/{total} students"),
+    )
+    return f"Generated {n} report cards."
+
+
+@app.route("/admin/course/<course_id>/report_cards", methods=["POST"])
+def admin_report_cards(course_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+    job_id = job_runner.submit("report_cards", course_id, _job_report_cards, course_id)
+    return redirect(url_for("admin_job", job_id=job_id))
+
+
+@app.route("/admin/course/<course_id>/export", methods=["POST"])
+def admin_export_course(course_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+    job_id = job_runner.submit("export", course_id, _job_export_csv, course_id)
+    return redirect(url_for("admin_job", job_id=job_id))
+
+
+@app.route("/admin/course/<course_id>/import", methods=["POST"])
+def admin_import_course(course_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Choose a CSV file to import.", "warning")
+        return redirect(url_for("admin_course", course_id=course_id))
+
+    # เก็บไฟล์ไว้ให้ job อ่าน (job ลบเองเมื่ออ่านเสร็จ)
+    os.makedirs(JOB_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=JOB_DIR)
+    with os.fdopen(fd, "wb") as f:
+        upload.save(f)
+    job_id = job_runner.submit("import", course_id, _job_import_csv, course_id, path)
+    return redirect(url_for("admin_job", job_id=job_id))
+
+
+@app.route("/admin/jobs")
+def admin_jobs():
+    if not require_admin():
+        return redirect(url_for("login"))
+    return render_template("admin_jobs.html", jobs=job_runner.recent())
+
+
+@app.route("/admin/jobs/<int:job_id>")
+def admin_job(job_id):
+    """หน้า progress ของงาน; ?format=json สำหรับ poll จาก JavaScript"""
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    job = job_runner.get(job_id)
+    if job is None:
+        flash("Job not found.", "danger")
+        return redirect(url_for("admin_jobs"))
+    if request.args.get("format") == "json":
+        return jsonify(job)
+    return render_template("admin_job.html", job=job)
+
+
+@app.route("/admin/jobs/<int:job_id>/cancel", methods=["POST"])
+def admin_cancel_job(job_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+    job_runner.cancel(job_id)
+    flash("Cancellation requested.", "info")
+    return redirect(url_for("admin_job", job_id=job_id))
+
+
+@app.route("/admin/jobs/<int:job_id>/download")
+def admin_download_job(job_id):
+    if not require_admin():
+        return redirect(url_for("login"))
+
+    job = job_runner.get(job_id)
+    if not job or job["status"] != "done" or not job["result_name"]:
+        flash("This job has no result to download.", "warning")
+        return redirect(url_for("admin_jobs"))
+    path = os.path.join(JOB_DIR, f"{job_id}-{job['result_name']}")
+    return send_file(os.path.abspath(path), as_attachment=True,
+                     download_name=job["result_name"])
+
+
 # --------------------------------------------------------
 # STUDENT VIEW
 # --------------------------------------------------------
+@app.route("/student/courses")
+def student_courses():
+    """ภาพรวมทุก course ของนักศึกษา (ต้อง login แบบ All my courses)"""
+    if session.get("role") != "student" or not session.get("multi"):
+        return redirect(url_for("login"))
+
+    enrolled = fetch_student_courses(session["user_id"])
+    items = [
+        {"row": row, "course": course, "scores": cached_scores(row, course)}
+        for row, course in enrolled
+        if row["status"] != "suspend"
+    ]
+    return render_template("student_courses.html", items=items)
+
+
+@app.route("/student/course/<course_id>")
+def student_switch_course(course_id):
+    if session.get("role") != "student" or not session.get("multi"):
+        return redirect(url_for("login"))
+
+    enrolled = {
+        course["course"] for row, course in fetch_student_courses(session["user_id"])
+        if row["status"] != "suspend"
+    }
+    if course_id not in enrolled:
+        flash("You are not enrolled in this course.", "warning")
+        return redirect(url_for("student_courses"))
+
+    session["course"] = course_id
+    return redirect(url_for("student_home"))
+
+
 @app.route("/student")
 def student_home():
     if session.get("role") != "student":
@@ -961,45 +3250,90 @@ def student_home():
     course_id = session.get("course")
     user_id = session.get("user_id")
 
-    conn = get_db()
+    # สรุปคะแนนจาก generated column (ไม่ดึงคะแนนย่อยทุกช่อง)
+    # คะแนนย่อยโหลดทีหลังจาก student_items เมื่อกดเปิดแต่ละหมวด
+    conn = get_db(course_id)
     row = conn.execute(
-        "SELECT * FROM scores WHERE course=? AND user_id=?",
+        f"SELECT id, course, user_id, fullname, status, {_SUMMARY_SELECT} "
+        f"FROM scores WHERE course=? AND user_id=?",
         (course_id, user_id)
     ).fetchone()
     course = conn.execute(
         "SELECT * FROM courses WHERE course=?",
         (course_id,)
     ).fetchone()
-    conn.close()
 
     if not row or not course:
+        conn.close()
         flash("No score record found.", "warning")
         return redirect(url_for("login"))
 
     student = dict(row)
     course_dict = dict(course)
-    scores = compute_scores(student, course_dict)
+    scores = {key: student[key] for key, _ in SUMMARY_SQL}
 
+    ranking = get_course_ranking(conn, course_dict)
+    conn.close()
+    standing = {
+        "rank": ranking.rank(scores["total"]),
+        "count": len(ranking),
+        "percentile": ranking.percentile(scores["total"]),
+        "letter": ranking.letter(scores["total"]),
+    }
 
     return render_template(
         "student.html",
         student=student,
         course=course,
         scores=scores,
-        CLASS_COUNT=CLASS_COUNT,
-        LAB_COUNT=LAB_COUNT,
-        HW_COUNT=HW_COUNT,
-        QUIZ_COUNT=QUIZ_COUNT
+        standing=standing,
+        lazy_items=True,
     )
 
 
+# คะแนนย่อยต่อหมวดที่หน้า student โหลดแยก (prefix ของคอลัมน์ -> keys)
+ITEM_KEYS = {"hw": HW_KEYS, "quiz": QUIZ_KEYS, "lab": LAB_KEYS, "class": CLASS_KEYS}
+
+
+@app.route("/student/items/<category>")
+def student_items(category):
+    """คะแนนย่อยของหมวดเดียวเป็น JSON (cache ใน browser ได้จนกว่าแถวจะถูกแก้)
+
+    ETag = row version: ยังไม่มีใครแก้คะแนน -> ตอบ 304 ไม่ส่ง body
+    """
+    if session.get("role") != "student" or category not in ITEM_KEYS:
+        return jsonify(error="not found"), 404
+
+    course_id = session.get("course")
+    conn = get_db(course_id)
+    row = conn.execute(
+        f"SELECT id, version, {', '.join(ITEM_KEYS[category])} "
+        f"FROM scores WHERE course=? AND user_id=?",
+        (course_id, session.get("user_id"))
+    ).fetchone()
+    conn.close()
+    if row is None:
+        return jsonify(error="not found"), 404
+
+    resp = jsonify(category=category,
+                   values=[row[k] or 0 for k in ITEM_KEYS[category]])
+    # private: เป็นข้อมูลของคนที่ login อยู่ ห้าม proxy cache ร่วมกัน
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.set_etag(hashlib.sha1(
+        f"{course_id}\0{row['id']}\0{row['version']}\0{category}".encode("utf-8")
+    ).hexdigest()[:16])
+    return resp.make_conditional(request)
+
+
 # --------------------------------------------------------
 # RUN
 # --------------------------------------------------------
-if __name__ == "__main__":
-    # สร้าง / อัปเดตตารางเสมอ
-    init_db()
+# gunicorn / uvicorn / flask run import app โดยไม่ผ่าน __main__
+# -> สร้าง / migrate ตารางตอน import เสมอ (DB เดิมที่ยังไม่มีคอลัมน์ / ตารางใหม่)
+init_db()
 
+if __name__ == "__main__":
     # เวลาอยู่บน Render ต้องดึง PORT จาก environment
     import os
     port = int(os.environ.get("PORT", 5000))
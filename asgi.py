@@ -0,0 +1,244 @@
+"""ASGI entry point: รับ connection พร้อมกันจำนวนมากด้วย event loop
+
+request ที่รอ (เช่นนักศึกษาหลายพันคนเปิด /student พร้อมกัน) เป็นแค่ coroutine
+ใน event loop ส่วนงานที่แตะ SQLite (ตัว Flask view) รันใน thread pool ขนาดคงที่
+-> จำนวน thread / connection / หน่วยความจำมีขอบเขต ไม่ต้องเพิ่ม worker process
+
+    pip install uvicorn
+    uvicorn asgi:application --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:application
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, init_db
+
+# thread ที่รัน view (= connection SQLite ที่เปิดพร้อมกันได้สูงสุด) ต่อ process
+ASGI_DB_THREADS = int(os.environ.get("ASGI_DB_THREADS", "8"))
+# thread สำหรับ response แบบ stream (SSE dashboard) แยกไม่ให้แย่ง thread ของ view
+ASGI_STREAM_THREADS = int(os.environ.get("ASGI_STREAM_THREADS", "32"))
+# request ที่ค้างอยู่ได้สูงสุด (กำลังรับ body / รอคิว / ส่ง stream) เกินนี้ตอบ 503 ทันที
+# (กันหน่วยความจำโตไม่จำกัด)
+ASGI_MAX_PENDING = int(os.environ.get("ASGI_MAX_PENDING", "5000"))
+# ขนาด body สูงสุด (import CSV) เกินนี้ตอบ 413
+ASGI_MAX_BODY_MB = float(os.environ.get("ASGI_MAX_BODY_MB", "32"))
+# body ที่ buffer ไว้รวมกันทุก request ต่อ process เกินนี้ตอบ 503
+# (max_pending x max_body ไม่ได้จำกัดหน่วยความจำจริง: 5000 x 32 MB = 160 GB)
+ASGI_MAX_BUFFER_MB = float(os.environ.get("ASGI_MAX_BUFFER_MB", "256"))
+
+
+class WsgiToAsgi:
+    """แปลง WSGI app (Flask) เป็น ASGI app โดยรัน view ใน thread pool ที่จำกัดขนาด"""
+
+    def __init__(self, wsgi_app, threads=8, stream_threads=32,
+                 max_pending=5000, max_body=32 * 1024 * 1024,
+                 max_buffered=256 * 1024 * 1024, startup=None):
+        self.wsgi_app = wsgi_app
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.max_buffered = max_buffered
+        self.startup = startup      # เรียกใน thread ก่อนตอบ lifespan.startup.complete
+        # แตะจาก event loop thread เท่านั้น
+        self.pending = 0            # request ที่ค้างอยู่
+        self.buffered = 0           # byte ของ body ที่ buffer ไว้รวมทุก request
+        self._threads = threads
+        self._stream_threads = stream_threads
+        self._lock = threading.Lock()
+        self._pools = None
+        self._pid = None
+
+    def _executors(self):
+        # สร้างแบบ lazy และเช็ค pid เผื่อถูก fork (แบบเดียวกับ JobRunner)
+        with self._lock:
+            if self._pools is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pools = (
+                    ThreadPoolExecutor(self._threads, thread_name_prefix="asgi-db"),
+                    ThreadPoolExecutor(self._stream_threads,
+                                       thread_name_prefix="asgi-stream"),
+                )
+            return self._pools
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.startup is not None:
+                    # เช่น migrate schema: ทำให้เสร็จก่อนรับ request โดยไม่ block event loop
+                    try:
+                        await asyncio.get_running_loop().run_in_executor(None, self.startup)
+                    except Exception as e:
+                        await send({"type": "lifespan.startup.failed",
+                                    "message": f"{type(e).__name__}: {e}"})
+                        return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._pools is not None:
+                    for pool in self._pools:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        if self.pending >= self.max_pending:
+            await _plain(send, 503, b"Server busy, please retry.")
+            return
+
+        # นับตั้งแต่เริ่มรับ body: client ที่ upload ช้า ๆ ก็กิน buffer อยู่แล้ว
+        self.pending += 1
+        held = 0                    # byte ที่ request นี้นับอยู่ใน self.buffered
+        try:
+            body = bytearray()
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                chunk = message.get("body", b"")
+                if len(body) + len(chunk) > self.max_body:
+                    await _plain(send, 413, b"Request body too large.")
+                    return
+                if self.buffered + len(chunk) > self.max_buffered:
+                    await _plain(send, 503, b"Server busy, please retry.")
+                    return
+                body += chunk
+                self.buffered += len(chunk)
+                held += len(chunk)
+                if not message.get("more_body"):
+                    break
+
+            db_pool, stream_pool = self._executors()
+            loop = asyncio.get_running_loop()
+            status, headers, chunks, stream = await loop.run_in_executor(
+                db_pool, self._call_app, _environ(scope, bytes(body))
+            )
+            # view อ่าน body ไปแล้ว: คืนโควตา (stream อาจเปิดค้างอีกนาน)
+            del body
+            self.buffered -= held
+            held = 0
+
+            await send({"type": "http.response.start", "status": status,
+                        "headers": headers})
+            if stream is None:
+                await send({"type": "http.response.body", "body": b"".join(chunks)})
+                return
+            await self._stream(stream, receive, send, loop, stream_pool)
+        finally:
+            self.pending -= 1
+            self.buffered -= held
+
+    def _call_app(self, environ):
+        """รัน Flask ใน thread: คืน (status, headers, chunks, iterator ถ้าเป็น stream)"""
+        started = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ]
+            return written.append
+
+        result = self.wsgi_app(environ, start_response)
+        # response ปกติ (มี Content-Length) อ่านให้จบใน thread นี้เลย
+        if any(name == b"content-length" for name, _ in started["headers"]):
+            try:
+                written.extend(result)
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+            return started["status"], started["headers"], written, None
+        return started["status"], started["headers"], written, iter(result)
+
+    async def _stream(self, result, receive, send, loop, pool):
+        """ส่ง response แบบ stream (SSE): ดึง chunk ทีละชิ้นใน stream pool จน client หลุด"""
+        done = object()
+        disconnected = asyncio.Event()
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            while not disconnected.is_set():
+                chunk = await loop.run_in_executor(pool, next, result, done)
+                if chunk is done:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk,
+                                "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            if hasattr(result, "close"):
+                # ปิด generator (เช่น live_unsubscribe ของ SSE) ใน thread
+                await loop.run_in_executor(pool, result.close)
+
+
+def _environ(scope, body):
+    """สร้าง WSGI environ จาก ASGI scope (PEP 3333)"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = f"HTTP_{name}"
+        if key in environ:
+            sep = "; " if key == "HTTP_COOKIE" else ","
+            value = environ[key] + sep + value
+        environ[key] = value
+    return environ
+
+
+async def _plain(send, status, text):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                            (b"content-length", str(len(text)).encode())]})
+    await send({"type": "http.response.body", "body": text})
+
+
+application = WsgiToAsgi(
+    flask_app,
+    threads=ASGI_DB_THREADS,
+    stream_threads=ASGI_STREAM_THREADS,
+    max_pending=ASGI_MAX_PENDING,
+    max_body=int(ASGI_MAX_BODY_MB * 1024 * 1024),
+    max_buffered=int(ASGI_MAX_BUFFER_MB * 1024 * 1024),
+    startup=init_db,
+)
@@ -0,0 +1,66 @@
+import json
+import math
+
+from curve import HIST_BINS
+
+
+class RunningStats:
+    """count / mean / M2 (Welford) / min / max / histogram ของค่าชุดเดียว
+
+    add / remove ทีละค่าเป็น O(1) ไม่ต้องวนทั้ง course
+    remove ค่าที่เป็น min/max จะคืน True -> caller ต้องหา min/max ใหม่เอง
+    """
+
+    __slots__ = ("cap", "n", "mean", "m2", "min", "max", "hist")
+
+    def __init__(self, cap, n=0, mean=0.0, m2=0.0, min=None, max=None, hist=None):
+        self.cap = cap or 100
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+        self.hist = list(hist) if hist else [0] * HIST_BINS
+
+    def _bin(self, x):
+        width = self.cap / HIST_BINS
+        return min(max(int(x / width), 0), HIST_BINS - 1)
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.hist[self._bin(x)] += 1
+
+    def remove(self, x):
+        """กลับด้าน Welford; คืน True ถ้า x เป็น min/max เดิม"""
+        self.hist[self._bin(x)] -= 1
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            self.min = self.max = None
+            return False
+        n = self.n - 1
+        mean = (self.n * self.mean - x) / n
+        self.m2 = max(self.m2 - (x - self.mean) * (x - mean), 0.0)
+        self.n, self.mean = n, mean
+        return x <= self.min or x >= self.max
+
+    @property
+    def std(self):
+        # population std (หารด้วย n) เหมือน curve.summarize
+        return math.sqrt(self.m2 / self.n) if self.n else 0.0
+
+    def summary(self):
+        return {"n": self.n, "mean": self.mean, "std": self.std,
+                "min": self.min or 0.0, "max": self.max or 0.0,
+                "hist": list(self.hist)}
+
+    def to_row(self):
+        return (self.n, self.mean, self.m2, self.min, self.max, json.dumps(self.hist))
+
+    @classmethod
+    def from_row(cls, cap, n, mean, m2, min_value, max_value, hist):
+        return cls(cap, n, mean, m2, min_value, max_value, json.loads(hist))
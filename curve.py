@@ -0,0 +1,101 @@
+import math
+
+# หมวดคะแนนจาก compute_scores -> คอลัมน์ max ใน courses
+CURVE_CATEGORIES = (
+    ("mid_term", "max_mid"),
+    ("final", "max_final"),
+    ("project1", "max_p1"),
+    ("project2", "max_p2"),
+    ("homework_score", "max_hw"),
+    ("quiz_score", "max_quiz"),
+    ("lab_score", "max_lab"),
+    ("class_score", "max_class"),
+)
+
+CURVE_METHODS = ("linear", "zscore")
+
+HIST_BINS = 10
+
+
+def hist_bin(total, max_total):
+    """ช่อง histogram (0 .. HIST_BINS-1) ของ total"""
+    width = (max_total or 100) / HIST_BINS
+    return min(max(int(total / width), 0), HIST_BINS - 1)
+
+
+def summarize(totals, max_total):
+    """mean / std / min / max + histogram (HIST_BINS ช่องตั้งแต่ 0 ถึง max_total)"""
+    n = len(totals)
+    if not n:
+        return {"n": 0, "mean": 0.0, "std": 0.0, "min": 0.0, "max": 0.0,
+                "hist": [0] * HIST_BINS}
+    mean = sum(totals) / n
+    std = math.sqrt(sum((t - mean) ** 2 for t in totals) / n)
+    hist = [0] * HIST_BINS
+    for t in totals:
+        hist[hist_bin(t, max_total)] += 1
+    return {"n": n, "mean": mean, "std": std,
+            "min": min(totals), "max": max(totals), "hist": hist}
+
+
+def _ratios(totals, method, max_total, target_mean, target_std):
+    """ตัวคูณต่อคน (ใช้คูณทุกหมวดของคนนั้น)"""
+    if method == "linear":
+        # คนที่ได้สูงสุดเท่ากับ max_total
+        top = max(totals, default=0)
+        k = max_total / top if top > 0 and max_total else 1.0
+        return [k] * len(totals)
+
+    if method == "zscore":
+        n = len(totals)
+        mean = sum(totals) / n if n else 0.0
+        std = math.sqrt(sum((t - mean) ** 2 for t in totals) / n) if n else 0.0
+        ratios = []
+        for t in totals:
+            z = (t - mean) / std if std else 0.0
+            new_t = max(target_mean + z * target_std, 0.0)
+            ratios.append(new_t / t if t > 0 else 1.0)
+        return ratios
+
+    raise ValueError(f"unknown curve method: {method!r}")
+
+
+def curve_course(score_list, course, method, target_mean=None, target_std=None):
+    """คำนวณ curve ของทั้ง course
+
+    score_list = [compute_scores(...), ...] เรียงเหมือนแถวของนักศึกษา
+    คืน dict:
+      ratios  : ตัวคูณต่อคน
+      new     : [{หมวด: คะแนนใหม่ (clip ที่ max_* แล้ว)}, ...]
+      before_totals / new_totals : total ก่อน/หลัง ต่อคน
+      before / after : summarize() ของ total ก่อน/หลัง
+    """
+    max_total = course.get("max_total") or 100
+    totals = [sc["total"] for sc in score_list]
+    if target_mean is None:
+        target_mean = sum(totals) / len(totals) if totals else 0.0
+    if target_std is None:
+        target_std = summarize(totals, max_total)["std"]
+
+    ratios = _ratios(totals, method, max_total, target_mean, target_std)
+
+    # ทำทีละหมวด (column-wise) ทั้ง course ในรอบเดียว
+    new_cols = {}
+    for cat, max_col in CURVE_CATEGORIES:
+        cap = course.get(max_col) or 0
+        col = [sc[cat] * r for sc, r in zip(score_list, ratios)]
+        new_cols[cat] = [min(v, cap) for v in col] if cap > 0 else col
+
+    new = [
+        {cat: new_cols[cat][i] for cat, _ in CURVE_CATEGORIES}
+        for i in range(len(score_list))
+    ]
+    new_totals = [sum(d.values()) for d in new]
+    return {
+        "ratios": ratios,
+        "new": new,
+        "before_totals": totals,
+        "new_totals": new_totals,
+        "before": summarize(totals, max_total),
+        "after": summarize(new_totals, max_total),
+    }
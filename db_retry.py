@@ -0,0 +1,51 @@
+import random
+import sqlite3
+import threading
+import time
+
+
+def is_locked(exc):
+    """SQLITE_BUSY / SQLITE_LOCKED: อีก connection ถือ lock อยู่ ลองใหม่ได้"""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
+
+
+class RetryStats:
+    """นับจำนวนครั้งที่ต้อง retry / ยอมแพ้ (stress_db.py ใช้รายงานผล)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.gave_up = 0
+
+    def add(self, retries=0, gave_up=0):
+        with self._lock:
+            self.retries += retries
+            self.gave_up += gave_up
+
+    def reset(self):
+        with self._lock:
+            self.retries = self.gave_up = 0
+
+
+def with_retry(fn, attempts=8, base_delay=0.005, max_delay=0.25, stats=None):
+    """เรียก fn() ใหม่เมื่อ DB locked โดยรอแบบ exponential backoff + jitter
+
+    fn ต้องเป็น transaction ทั้งก้อน (เปิด connection -> เขียน -> commit)
+    เพราะ BEGIN แบบ deferred ที่อ่านแล้วค่อยเขียนจะได้ SQLITE_BUSY ทันที
+    โดยไม่รอ busy timeout -> ต้อง rollback แล้วเริ่มใหม่ทั้ง transaction
+    """
+    for attempt in range(attempts + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not is_locked(e) or attempt == attempts:
+                if stats is not None and is_locked(e):
+                    stats.add(gave_up=1)
+                raise
+        if stats is not None:
+            stats.add(retries=1)
+        delay = min(max_delay, base_delay * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.5))
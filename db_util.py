@@ -0,0 +1,113 @@
+"""ค่าตั้ง / helper ของ DB ที่ใช้ร่วมกันระหว่าง app.py กับ worker process
+
+ไม่ import Flask หรือ app: worker ที่ spawn ขึ้นมา (report_cards, term_analytics)
+import โมดูลนี้ได้โดยไม่ต้องโหลด route / template / writer thread / job runner
+"""
+import hashlib
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+DB_PATH = "grades.db"
+
+# storage mode
+#   "single" = ทุก course อยู่ใน grades.db ไฟล์เดียว (ค่าเดิม)
+#   "shard"  = grades.db เป็น catalog (courses + admin row)
+#              ส่วน scores ของแต่ละ course แยกไฟล์อยู่ใน SHARD_DIR
+STORAGE_MODE = os.environ.get("STORAGE_MODE", "single")
+SHARD_DIR = os.environ.get("SHARD_DIR", "shards")
+
+CLASS_COUNT = 15
+LAB_COUNT = 15
+HW_COUNT = 5       # ตาม requirement เดิม: HW1..HW5
+QUIZ_COUNT = 10
+
+# ชื่อคอลัมน์ของแต่ละหมวด (สร้างครั้งเดียว ไม่ต้องประกอบ string ทุกครั้งที่คำนวณ)
+HW_KEYS = [f"hw_{i}" for i in range(1, HW_COUNT + 1)]
+QUIZ_KEYS = [f"quiz_{i}" for i in range(1, QUIZ_COUNT + 1)]
+LAB_KEYS = [f"lab_{i}" for i in range(1, LAB_COUNT + 1)]
+CLASS_KEYS = [f"class_{i}" for i in range(1, CLASS_COUNT + 1)]
+
+
+def sharded():
+    return STORAGE_MODE == "shard"
+
+
+def shard_path(course_id):
+    """ชื่อไฟล์ shard ของ course (กันอักขระแปลก ๆ ใน course id)"""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", course_id)
+    if safe != course_id:
+        safe += "-" + hashlib.sha1(course_id.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(SHARD_DIR, f"{safe}.db")
+
+
+def db_path(course_id=None):
+    if not sharded() or course_id in (None, "All"):
+        return DB_PATH
+    return shard_path(course_id)
+
+
+def readonly_connect(path):
+    """เปิด SQLite แบบ read-only (worker ของ report_cards / term_analytics ใช้ด้วย)"""
+    conn = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def compute_scores(row_dict, course_row):
+    """row_dict = แถวจาก scores, course_row = แถวจาก courses"""
+
+    # factor มาจาก course เท่านั้น
+    class_factor = course_row.get("class_factor") or 1
+    lab_factor   = course_row.get("lab_factor")   or 1
+    hw_factor    = course_row.get("hw_factor")    or 1
+    quiz_factor  = course_row.get("quiz_factor")  or 1
+
+    # Homework
+    hw_vals = [row_dict.get(k, 0) or 0 for k in HW_KEYS]
+    hw_sum = sum(hw_vals)
+    hw_score = hw_sum / hw_factor if hw_factor else 0.0
+
+    # Quiz
+    quiz_vals = [row_dict.get(k, 0) or 0 for k in QUIZ_KEYS]
+    quiz_sum = sum(quiz_vals)
+    quiz_score = quiz_sum / quiz_factor if quiz_factor else 0.0
+
+    # Lab
+    lab_vals = [row_dict.get(k, 0) or 0 for k in LAB_KEYS]
+    lab_sum = sum(lab_vals)
+    lab_score = lab_sum / lab_factor if lab_factor else 0.0
+
+    # Class
+    class_vals = [row_dict.get(k, 0) or 0 for k in CLASS_KEYS]
+    class_sum = sum(class_vals)
+    class_score = class_sum / class_factor if class_factor else 0.0
+
+    mid = row_dict.get("mid_term") or 0.0
+    final = row_dict.get("final") or 0.0
+    p1 = row_dict.get("project1") or 0.0
+    p2 = row_dict.get("project2") or 0.0
+
+    total = mid + final + p1 + p2 + hw_score + quiz_score + lab_score + class_score
+
+    return {
+        "mid_term": mid,
+        "final": final,
+        "project1": p1,
+        "project2": p2,
+
+        "homework_sum": hw_sum,
+        "homework_score": hw_score,
+
+        "quiz_sum": quiz_sum,
+        "quiz_score": quiz_score,
+
+        "lab_sum": lab_sum,
+        "lab_score": lab_score,
+
+        "class_sum": class_sum,
+        "class_score": class_score,
+
+        "total": total,
+    }
@@ -0,0 +1,96 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class CacheBudget:
+    """งบหน่วยความจำรวมที่หลาย cache ใช้ร่วมกัน (bytes)
+
+    cache ที่ใส่ของใหม่แล้วทำให้เกินงบจะไล่ของเก่าของตัวเองออกจนกลับมาอยู่ในงบ
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def charge(self, size):
+        """บวก / ลบขนาด คืนจำนวน bytes ที่เกินงบ"""
+        with self._lock:
+            self.used += size
+            return self.used - self.max_bytes
+
+
+class FragmentCache:
+    """LRU cache ของ HTML ที่ render แล้ว จำกัดด้วยขนาดหน่วยความจำรวม (bytes)
+
+    key ต้องมี version อยู่ในตัว (เช่น row version / course version)
+    ข้อมูลเปลี่ยน = key ใหม่ ของเก่าจะถูกดันออกไปเองตาม LRU
+    ใช้เก็บค่าอื่นที่ไม่ใช่ str ได้ โดยส่ง sizeof(value) ที่ประมาณขนาดได้ถูกกว่า
+    """
+
+    def __init__(self, max_bytes, budget=None, sizeof=sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self._sizeof = sizeof
+        self._items = OrderedDict()   # key -> (html, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return item[0]
+
+    def set(self, key, html):
+        size = self._sizeof(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._resize(-old[1])
+            self._items[key] = (html, size)
+            over = self._resize(size)
+            while self._items and (self._bytes > self.max_bytes or over > 0):
+                _, (_, evicted) = self._items.popitem(last=False)
+                over = self._resize(-evicted)
+                self.evictions += 1
+
+    def _resize(self, size):
+        # เรียกตอนถือ self._lock; คืนจำนวน bytes ที่งบรวมเกิน (ไม่มีงบรวม = 0)
+        self._bytes += size
+        return self.budget.charge(size) if self.budget is not None else 0
+
+    def discard(self, match):
+        """ลบทุก key ที่ match(key) เป็นจริง (เช่นทั้ง course ตอน archive)"""
+        with self._lock:
+            for key in [k for k in self._items if match(k)]:
+                self._resize(-self._items.pop(key)[1])
+
+    def stats(self):
+        """ตัวเลขสำหรับหน้า admin: จำนวน / ขนาด / hit / miss / eviction"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def size(self):
+        return self._bytes
@@ -0,0 +1,194 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+
+def _owner():
+    """process ที่รับงาน: "host:pid" (pool ของงานอยู่ใน process นั้นเท่านั้น)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner):
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False            # งานเก่าที่ไม่มี owner / ของเครื่องอื่น
+    pid = int(pid)
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        return False            # os.kill(pid, 0) บน Windows ไม่ใช่แค่เช็ค (ไม่มี gunicorn อยู่แล้ว)
+    try:
+        os.kill(pid, 0)         # signal 0 = เช็คว่ามี process อยู่ ไม่ได้ส่งอะไร
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobCancelled(Exception):
+    """admin กดยกเลิกระหว่างที่งานกำลังทำ"""
+
+
+class Job:
+    """handle ที่ส่งให้ฟังก์ชันของงาน: รายงาน progress / เช็คการยกเลิก / ไฟล์ผลลัพธ์"""
+
+    PROGRESS_INTERVAL = 0.5     # วินาที: ไม่เขียน progress ลง DB ถี่กว่านี้
+
+    def __init__(self, runner, job_id):
+        self.id = job_id
+        self._runner = runner
+        self._last = 0.0
+        self.result_name = None
+
+    def progress(self, pct, message=None):
+        """บันทึก % ที่ทำไปแล้ว (throttle) และ raise JobCancelled ถ้าถูกยกเลิก"""
+        now = time.monotonic()
+        if pct < 100 and now - self._last < self.PROGRESS_INTERVAL:
+            return
+        self._last = now
+        cancelled = self._runner._update(
+            self.id, progress=min(max(pct, 0.0), 100.0), message=message
+        )
+        if cancelled:
+            raise JobCancelled()
+
+    def result_path(self, name):
+        """path สำหรับเขียนไฟล์ผลลัพธ์ (ให้ดาวน์โหลดทีหลังด้วยชื่อ name)"""
+        os.makedirs(self._runner.result_dir, exist_ok=True)
+        self.result_name = name
+        return os.path.join(self._runner.result_dir, f"{self.id}-{name}")
+
+
+class JobRunner:
+    """รันงานหนักของ admin ใน thread pool แทนที่จะทำใน request
+
+    สถานะ / progress เก็บในตาราง jobs (connect() -> catalog DB)
+    ให้ทุก worker process เห็นตรงกัน ส่วน pool อยู่ใน process ที่รับงาน
+    """
+
+    def __init__(self, connect, result_dir, max_workers=2):
+        self._connect = connect
+        self.result_dir = result_dir
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _executor(self):
+        # สร้างแบบ lazy และเช็ค pid เผื่อถูก fork (gunicorn --preload)
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pool = ThreadPoolExecutor(self._max_workers,
+                                                thread_name_prefix="job")
+            return self._pool
+
+    def submit(self, kind, course, fn, *args):
+        """บันทึกงานใหม่ (queued) แล้วส่งเข้า pool; fn(job, *args)"""
+        conn = self._connect()
+        with conn:
+            job_id = conn.execute(
+                "INSERT INTO jobs (kind, course, status, progress, created_at, owner) "
+                "VALUES (?, ?, 'queued', 0, CURRENT_TIMESTAMP, ?)",
+                (kind, course, _owner())
+            ).lastrowid
+        conn.close()
+        self._executor().submit(self._run, job_id, fn, args)
+        return job_id
+
+    def get(self, job_id):
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def recent(self, limit=50):
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+
+    def cancel(self, job_id):
+        """ขอยกเลิก: งานที่ยังไม่เริ่มจะไม่ถูกรัน งานที่รันอยู่จะหยุดที่ progress ถัดไป"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET cancel_requested=1 "
+                "WHERE id=? AND status IN ('queued', 'running')", (job_id,)
+            )
+        conn.close()
+
+    def recover(self):
+        """ตอน start: งานที่ process เจ้าของตายไปแล้ว (restart / crash) ไม่มีใครทำต่อ
+
+        งานของ worker process อื่นที่ยังทำงานอยู่ (gunicorn หลาย worker) ไม่แตะ
+        """
+        conn = self._connect()
+        with conn:
+            stale = [
+                row[0] for row in conn.execute(
+                    "SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')"
+                )
+                if not _owner_alive(row[1])
+            ]
+            conn.executemany(
+                "UPDATE jobs SET status='failed', message='Interrupted by restart.', "
+                "finished_at=CURRENT_TIMESTAMP "
+                "WHERE id=? AND status IN ('queued', 'running')",
+                [(job_id,) for job_id in stale]
+            )
+        conn.close()
+
+    def _update(self, job_id, **fields):
+        """อัปเดตคอลัมน์ของงาน คืน True ถ้ามีคำขอยกเลิก"""
+        conn = self._connect()
+        with conn:
+            if fields:
+                conn.execute(
+                    f"UPDATE jobs SET {', '.join(f'{k}=?' for k in fields)} WHERE id=?",
+                    list(fields.values()) + [job_id]
+                )
+            row = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE id=?", (job_id,)
+            ).fetchone()
+        conn.close()
+        return bool(row and row[0])
+
+    def _finish(self, job_id, status, message=None, **fields):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"UPDATE jobs SET status=?, message=?, finished_at=CURRENT_TIMESTAMP"
+                f"{''.join(f', {k}=?' for k in fields)} WHERE id=?",
+                [status, message] + list(fields.values()) + [job_id]
+            )
+        conn.close()
+
+    def _run(self, job_id, fn, args):
+        job = Job(self, job_id)
+        if self._update(job_id):
+            self._finish(job_id, "cancelled", "Cancelled before start.")
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status='running', started_at=CURRENT_TIMESTAMP "
+                "WHERE id=?", (job_id,)
+            )
+        conn.close()
+        try:
+            message = fn(job, *args)
+        except JobCancelled:
+            self._finish(job_id, "cancelled", "Cancelled.")
+        except Exception as e:
+            self._finish(job_id, "failed", f"{type(e).__name__}: {e}")
+        else:
+            self._finish(job_id, "done", message, progress=100.0,
+                         result_name=job.result_name)
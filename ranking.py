@@ -0,0 +1,60 @@
+import bisect
+
+# เกณฑ์เกรดเริ่มต้น: "เกรด:เปอร์เซ็นต์ขั้นต่ำของ max_total"
+DEFAULT_GRADE_CUTOFFS = "A:80, B+:75, B:70, C+:65, C:60, D+:55, D:50, F:0"
+
+
+def parse_cutoffs(text):
+    """'A:80, B:70, F:0' -> [(0.0, 'F'), (70.0, 'B'), (80.0, 'A')] (เรียงน้อยไปมาก)
+
+    raise ValueError ถ้ารูปแบบผิด หรือเกณฑ์ต่ำสุดไม่ใช่ 0
+    (ไม่มีพื้นที่ 0 คะแนนที่ต่ำกว่าทุกเกณฑ์จะได้เกรดต่ำสุดที่ตั้งไว้ เช่น B)
+    """
+    text = (text or "").strip() or DEFAULT_GRADE_CUTOFFS
+    cutoffs = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        letter, sep, pct = part.partition(":")
+        if not sep or not letter.strip():
+            raise ValueError(f"bad grade cutoff: {part!r}")
+        cutoffs.append((float(pct), letter.strip()))
+    if not cutoffs:
+        raise ValueError("no grade cutoffs")
+    cutoffs.sort()
+    if cutoffs[0][0] > 0:
+        raise ValueError("lowest grade cutoff must be 0 (e.g. F:0)")
+    return cutoffs
+
+
+class CourseRanking:
+    """อันดับ / percentile / เกรด ของ course เดียว
+
+    สร้างครั้งเดียวต่อ course version (sort totals O(n log n))
+    จากนั้นถามแต่ละคนด้วย bisect O(log n)
+    """
+
+    def __init__(self, totals, cutoffs, max_total):
+        self.totals = sorted(totals)
+        scale = (max_total or 100) / 100.0
+        self._cut_scores = [pct * scale for pct, _ in cutoffs]
+        self._letters = [letter for _, letter in cutoffs]
+
+    def __len__(self):
+        return len(self.totals)
+
+    def rank(self, total):
+        """อันดับแบบ 1 = คะแนนสูงสุด (คะแนนเท่ากันได้อันดับเดียวกัน)"""
+        return len(self.totals) - bisect.bisect_right(self.totals, total) + 1
+
+    def percentile(self, total):
+        """เปอร์เซ็นต์ของนักศึกษาที่ได้คะแนน <= total"""
+        if not self.totals:
+            return 0.0
+        return 100.0 * bisect.bisect_right(self.totals, total) / len(self.totals)
+
+    def letter(self, total):
+        # +1e-9 กัน 79.99999... จากการหาร factor ตกเกรด
+        i = bisect.bisect_right(self._cut_scores, total + 1e-9) - 1
+        return self._letters[max(i, 0)]
@@ -0,0 +1,198 @@
+"""สร้าง report card (HTML พร้อมพิมพ์ / แปลง PDF) ของนักศึกษา active ทุกคนใน course
+
+render กระจายไปหลาย process (1 chunk ต่อ worker) แต่ละ worker เปิด SQLite
+แบบ read-only ของตัวเอง -> ความเร็วเพิ่มตามจำนวน core
+
+    python report_cards.py CG2025 --out reports/
+    python report_cards.py CG2025 --zip reports.zip --workers 8
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+import db_util
+from db_util import compute_scores, readonly_connect
+from ranking import CourseRanking, parse_cutoffs
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# แท่งในกราฟ: (ชื่อ, key จาก compute_scores, คอลัมน์คะแนนเต็มใน courses)
+CHART = (
+    ("Mid-term", "mid_term", "max_mid"),
+    ("Final", "final", "max_final"),
+    ("Project 1", "project1", "max_p1"),
+    ("Project 2", "project2", "max_p2"),
+    ("Homework", "homework_score", "max_hw"),
+    ("Quiz", "quiz_score", "max_quiz"),
+    ("Lab", "lab_score", "max_lab"),
+    ("Class", "class_score", "max_class"),
+    ("Total", "total", "max_total"),
+)
+
+
+def report_filename(user_id):
+    """ชื่อไฟล์ของแต่ละคน (กันอักขระแปลก ๆ ใน user_id แบบเดียวกับชื่อ shard)"""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)
+    if safe != user_id:
+        safe += "-" + hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:8]
+    return f"{safe}.html"
+
+
+# --------------------------------------------------------
+# worker (แต่ละ process)
+# --------------------------------------------------------
+_worker = {}
+
+
+def _init_worker(db_path, course, totals, out_dir):
+    try:
+        cutoffs = parse_cutoffs(course.get("grade_cutoffs"))
+    except ValueError:
+        cutoffs = parse_cutoffs(None)
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR),
+                      autoescape=select_autoescape(["html"]))
+    _worker.update(
+        conn=readonly_connect(db_path),
+        course=course,
+        ranking=CourseRanking(totals, cutoffs, course.get("max_total")),
+        template=env.get_template("report_card.html"),
+        counts={"CLASS_COUNT": db_util.CLASS_COUNT, "LAB_COUNT": db_util.LAB_COUNT,
+                "HW_COUNT": db_util.HW_COUNT, "QUIZ_COUNT": db_util.QUIZ_COUNT},
+        out_dir=out_dir,
+    )
+
+
+def _render_chunk(ids):
+    """render นักศึกษาชุดหนึ่ง: เขียนไฟล์ลง out_dir หรือคืน [(ชื่อไฟล์, html)] (โหมด zip)"""
+    w = _worker
+    course, ranking = w["course"], w["ranking"]
+    rows = w["conn"].execute(
+        "SELECT * FROM scores WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(ids),)
+    ).fetchall()
+
+    results = []
+    for row in rows:
+        student = dict(row)
+        scores = compute_scores(student, course)
+        total = scores["total"]
+        html = w["template"].render(
+            student=student,
+            course=course,
+            scores=scores,
+            standing={
+                "rank": ranking.rank(total),
+                "count": len(ranking),
+                "percentile": ranking.percentile(total),
+                "letter": ranking.letter(total),
+            },
+            chart=[(label, scores[key], course.get(cap) or 0)
+                   for label, key, cap in CHART],
+            **w["counts"],
+        )
+        name = report_filename(student["user_id"])
+        if w["out_dir"] is None:
+            results.append((name, html))
+        else:
+            with open(os.path.join(w["out_dir"], name), "w", encoding="utf-8") as f:
+                f.write(html)
+            results.append((name, None))
+    return results
+
+
+# --------------------------------------------------------
+# parent
+# --------------------------------------------------------
+def generate_report_cards(db_path, course, out_dir=None, zip_file=None,
+                          workers=None, chunk_size=None, progress=None):
+    """สร้าง report card ของนักศึกษา active ทุกคนใน course คืนจำนวนไฟล์
+
+    db_path  : ไฟล์ที่มี scores ของ course (grades.db หรือ shard)
+    course   : dict แถวจาก courses
+    out_dir  : เขียนไฟล์ละคนลง directory นี้ หรือ
+    zip_file : path / file object ของ zip (worker ส่ง html กลับมา ตัวแม่เขียน zip)
+    progress : progress(done, total) เรียกทุกครั้งที่ chunk เสร็จ
+    """
+    if (out_dir is None) == (zip_file is None):
+        raise ValueError("give exactly one of out_dir or zip_file")
+
+    # เฉพาะนักศึกษา active เหมือนหน้า student: ทุกใบอันดับเทียบกับกลุ่มเดียวกัน
+    conn = readonly_connect(db_path)
+    rows = conn.execute(
+        "SELECT id, total FROM scores "
+        "WHERE course=? AND user_id<>'admin' AND status='active' ORDER BY user_id",
+        (course["course"],)
+    ).fetchall()
+    conn.close()
+    ids = [r["id"] for r in rows]
+    totals = [r["total"] for r in rows]
+    if not ids:
+        return 0
+
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or math.ceil(len(ids) / workers)
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    # spawn: ไม่ fork process ที่มี thread อื่นอยู่ (score writer / job runner)
+    pool = ProcessPoolExecutor(
+        max_workers=min(workers, len(chunks)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(os.path.abspath(db_path), course, totals,
+                  None if out_dir is None else os.path.abspath(out_dir)),
+    )
+    archive = zipfile.ZipFile(zip_file, "w", zipfile.ZIP_DEFLATED) if zip_file else None
+    done = 0
+    try:
+        futures = [pool.submit(_render_chunk, chunk) for chunk in chunks]
+        for fut in as_completed(futures):
+            results = fut.result()
+            if archive is not None:
+                for name, html in results:
+                    archive.writestr(name, html)
+            done += len(results)
+            if progress:
+                progress(done, len(ids))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        if archive is not None:
+            archive.close()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("course")
+    parser.add_argument("--out", help="directory สำหรับไฟล์ HTML")
+    parser.add_argument("--zip", help="เขียนทุกไฟล์ลง zip นี้แทน")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    conn = readonly_connect(db_util.DB_PATH)
+    course = conn.execute(
+        "SELECT * FROM courses WHERE course=?", (args.course,)
+    ).fetchone()
+    conn.close()
+    if course is None:
+        parser.error(f"course {args.course!r} not found")
+
+    n = generate_report_cards(
+        db_util.db_path(args.course), dict(course),
+        out_dir=args.out, zip_file=args.zip, workers=args.workers,
+        progress=lambda done, total: print(f"\r{done}/{total}", end="", flush=True),
+    )
+    print(f"\n{n} report cards written.")
+
+
+if __name__ == "__main__":
+    main()
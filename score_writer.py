@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from db_retry import is_locked
+
+
+class ScoreWriter:
+    """writer thread เดียวต่อ process สำหรับเขียน scores แบบ group commit
+
+    request แต่ละตัวส่ง mutation (ฟังก์ชัน fn(conn)) เข้าคิว แล้วรอผล
+    writer จะเก็บ mutation ที่มาถึงในช่วง interval เดียวกัน รวมเป็น
+    transaction เดียวต่อไฟล์ DB -> commit / fsync ครั้งเดียวทั้ง batch
+
+    mutation แต่ละตัวอยู่ใน SAVEPOINT ของตัวเอง ถ้าตัวไหน error
+    จะ rollback เฉพาะตัวนั้น ตัวอื่นใน batch ยัง commit ได้ตามปกติ
+    ยกเว้น DB locked: rollback ทั้ง batch แล้วให้ retry(fn) เริ่มใหม่ทั้งก้อน
+    """
+
+    def __init__(self, connect, db_key, interval=0.005, max_batch=256, retry=None):
+        self._connect = connect      # connect(course_id) -> sqlite3.Connection
+        self._db_key = db_key        # db_key(course_id) -> path ของไฟล์ DB
+        self._retry = retry or (lambda fn: fn())
+        self._interval = interval
+        self._max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, course_id, fn):
+        """ส่ง mutation เข้าคิว คืน Future ที่จะได้ค่าที่ fn return หลัง commit"""
+        self._ensure_thread()
+        fut = Future()
+        self._queue.put((course_id, fn, fut))
+        return fut
+
+    def run(self, course_id, fn, timeout=30):
+        """submit แล้วรอจน batch ของตัวเอง commit เสร็จ"""
+        return self.submit(course_id, fn).result(timeout)
+
+    def _ensure_thread(self):
+        # start แบบ lazy และเช็ค pid เผื่อถูก fork (gunicorn --preload)
+        with self._lock:
+            if (self._thread is None or not self._thread.is_alive()
+                    or self._pid != os.getpid()):
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._loop, name="score-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._interval
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # แยกตามไฟล์ DB (single mode = ไฟล์เดียว, shard mode = ต่อ course)
+            groups = {}
+            for item in batch:
+                groups.setdefault(self._db_key(item[0]), []).append(item)
+            for items in groups.values():
+                self._commit(items)
+
+    def _commit(self, items):
+        try:
+            results = self._retry(lambda: self._attempt(items))
+        except Exception as e:
+            for _, _, fut in items:
+                fut.set_exception(e)
+            return
+
+        for fut, res, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+    def _attempt(self, items):
+        """รันทั้ง batch ใน transaction เดียว คืน [(future, ผลลัพธ์, error)]"""
+        results = []
+        conn = self._connect(items[0][0])
+        try:
+            conn.isolation_level = None
+            # BEGIN แบบ deferred: BEGIN IMMEDIATE จะจอง lock ทุกไฟล์ที่ ATTACH ไว้
+            # (รวม catalog) ทำให้ shard คนละไฟล์เขียนพร้อมกันไม่ได้
+            conn.execute("BEGIN")
+            for _, fn, fut in items:
+                conn.execute("SAVEPOINT mutation")
+                try:
+                    res = fn(conn)
+                except Exception as e:
+                    if is_locked(e):
+                        raise       # ไม่ใช่ความผิดของ mutation นี้: เริ่มใหม่ทั้ง batch
+                    conn.execute("ROLLBACK TO mutation")
+                    conn.execute("RELEASE mutation")
+                    results.append((fut, None, e))
+                else:
+                    conn.execute("RELEASE mutation")
+                    results.append((fut, res, None))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return results
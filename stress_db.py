@@ -0,0 +1,203 @@
+"""Stress test การเขียน SQLite พร้อมกันหลาย thread / หลาย process
+
+สร้าง DB ชั่วคราว แล้วให้ทุก worker ยิง request ผ่าน app.test_client() ปน ๆ กัน:
+แก้คะแนน (admin_edit_student), เพิ่มนักศึกษา (admin_add_student),
+reset + ตั้ง password ตอน login ครั้งแรก และหน้าอ่าน (admin_course / student)
+รายงาน lock error, จำนวน retry และ throughput / latency ของแต่ละแบบ
+
+    python stress_db.py                          # 2 process x 8 thread, 10 วินาที
+    python stress_db.py --no-retry               # baseline: ไม่มี busy timeout / retry
+    python stress_db.py --mode shard --direct --procs 4 --threads 16 --seconds 30
+
+exit code 1 ถ้ายังมี lock error หรือ error อื่น
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from db_retry import is_locked
+
+COURSE = "STRESS"
+OPS = ("edit", "add", "login", "read")
+ADMIN_PW = "stress"
+
+
+def _setup_env(args, workdir):
+    """ต้องตั้งก่อน import app (config อ่านจาก env ตอน import)"""
+    os.chdir(workdir)
+    os.environ["STORAGE_MODE"] = args.mode
+    os.environ["GROUP_COMMIT"] = "0" if args.direct else "1"
+    os.environ["JOB_DIR"] = os.path.join(workdir, "jobs")
+    if args.no_retry:
+        os.environ["WRITE_RETRIES"] = "0"
+        os.environ["DB_BUSY_TIMEOUT_MS"] = "0"
+
+
+def _admin_client(app):
+    client = app.app.test_client()
+    client.post("/login", data={"course": "All", "user_id": "admin",
+                                "password": ADMIN_PW, "password_confirm": ADMIN_PW})
+    return client
+
+
+def _prepare(args, workdir):
+    """สร้าง course + นักศึกษาตั้งต้นใน process แม่"""
+    _setup_env(args, workdir)
+    import app
+
+    app.init_db()
+    client = _admin_client(app)
+    client.post("/admin/course/add", data={
+        "course": COURSE, "name": "Stress test", "max_total": 100,
+        "max_mid": 30, "max_final": 30, "max_p1": 20, "max_p2": 20,
+    })
+    for i in range(args.students):
+        client.post(f"/admin/course/{COURSE}/add", data={
+            "user_id": f"s{i:04d}", "fullname": f"Student {i}", "status": "active",
+        })
+
+
+# --------------------------------------------------------
+# worker process
+# --------------------------------------------------------
+def _worker(args, workdir, proc_no):
+    _setup_env(args, workdir)
+    import app
+
+    app.app.testing = True          # exception (รวม database is locked) ส่งออกมาถึงเรา
+    conn = app.get_db(COURSE)
+    students = [tuple(r) for r in conn.execute(
+        "SELECT id, user_id FROM scores WHERE course=? AND user_id<>'admin'", (COURSE,)
+    )]
+    conn.close()
+
+    lock = threading.Lock()
+    results = {op: {"ok": 0, "locked": 0, "error": 0, "latency": []} for op in OPS}
+    deadline = time.monotonic() + args.seconds
+
+    def record(op, started, outcome):
+        with lock:
+            r = results[op]
+            r[outcome] += 1
+            r["latency"].append(time.monotonic() - started)
+
+    def run_thread(thread_no):
+        rnd = random.Random(proc_no * 1000 + thread_no)
+        admin = _admin_client(app)
+        added = 0
+        while time.monotonic() < deadline:
+            op = rnd.choices(OPS, weights=args.mix)[0]
+            sid, user_id = rnd.choice(students)
+            started = time.monotonic()
+            try:
+                if op == "edit":
+                    resp = admin.post(f"/admin/course/{COURSE}/student/{sid}/edit", data={
+                        "fullname": f"Student {user_id}", "status": "active",
+                        "mid_term": rnd.randint(0, 30), "final": rnd.randint(0, 30),
+                        "project1": rnd.randint(0, 20), "hw_1": rnd.randint(0, 10),
+                    })
+                elif op == "add":
+                    added += 1
+                    resp = admin.post(f"/admin/course/{COURSE}/add", data={
+                        "user_id": f"p{proc_no}t{thread_no}n{added}",
+                        "fullname": "Added", "status": "active",
+                        "mid_term": rnd.randint(0, 30),
+                    })
+                elif op == "login":
+                    # reset แล้ว login ครั้งแรก (ตั้ง password ใหม่) อีกรอบ
+                    admin.post(f"/admin/course/{COURSE}/student/{sid}/reset_password")
+                    resp = app.app.test_client().post("/login", data={
+                        "course": COURSE, "user_id": user_id,
+                        "password": "pw", "password_confirm": "pw",
+                    })
+                else:
+                    resp = admin.get(f"/admin/course/{COURSE}")
+            except sqlite3.OperationalError as e:
+                record(op, started, "locked" if is_locked(e) else "error")
+                continue
+            except Exception:
+                record(op, started, "error")
+                continue
+            record(op, started, "ok" if resp.status_code < 400 else "error")
+
+    threads = [threading.Thread(target=run_thread, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, app.retry_stats.retries, app.retry_stats.gave_up
+
+
+# --------------------------------------------------------
+# parent
+# --------------------------------------------------------
+def _pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("single", "shard"), default="single")
+    parser.add_argument("--procs", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8, help="ต่อ process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--mix", type=int, nargs=4, default=(40, 10, 10, 40),
+                        metavar=("EDIT", "ADD", "LOGIN", "READ"),
+                        help="น้ำหนักของแต่ละแบบ")
+    parser.add_argument("--direct", action="store_true",
+                        help="ไม่ใช้ group commit (ทุก request เขียนเอง)")
+    parser.add_argument("--no-retry", action="store_true",
+                        help="baseline: DB_BUSY_TIMEOUT_MS=0 และ WRITE_RETRIES=0")
+    parser.add_argument("--keep", action="store_true", help="ไม่ลบ directory ชั่วคราว")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stress_db-")
+    here = os.getcwd()
+    try:
+        _prepare(args, workdir)
+        # spawn: worker แต่ละตัว import app ใหม่ (มี writer thread / connection ของตัวเอง)
+        with ProcessPoolExecutor(args.procs,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            outs = list(pool.map(_worker, [args] * args.procs, [workdir] * args.procs,
+                                 range(args.procs)))
+    finally:
+        os.chdir(here)
+        if args.keep:
+            print(f"workdir: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"mode={args.mode} group_commit={not args.direct} retry={not args.no_retry} "
+          f"procs={args.procs} threads={args.threads} seconds={args.seconds:g}")
+    print(f"{'op':<6} {'ok':>7} {'locked':>7} {'error':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    total_ok = total_locked = total_error = 0
+    for op in OPS:
+        ok = sum(o[0][op]["ok"] for o in outs)
+        locked = sum(o[0][op]["locked"] for o in outs)
+        error = sum(o[0][op]["error"] for o in outs)
+        latency = [v for o in outs for v in o[0][op]["latency"]]
+        total_ok, total_locked, total_error = (total_ok + ok, total_locked + locked,
+                                               total_error + error)
+        print(f"{op:<6} {ok:>7} {locked:>7} {error:>6} "
+              f"{_pct(latency, 50) * 1000:>8.1f} {_pct(latency, 95) * 1000:>8.1f}")
+    retries = sum(o[1] for o in outs)
+    gave_up = sum(o[2] for o in outs)
+    print(f"total ok={total_ok} locked={total_locked} error={total_error} "
+          f"retries={retries} gave_up={gave_up} "
+          f"throughput={total_ok / args.seconds:.0f} ops/s")
+    return 1 if total_locked or total_error else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
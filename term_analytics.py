@@ -0,0 +1,212 @@
+"""เปรียบเทียบการกระจายคะแนนของแต่ละ course ข้ามหลายเทอม (หลายไฟล์ grades.db)
+
+แต่ละไฟล์ (grades.db ของเทอมนั้น / grades_archive.db / archive/*.db.gz) ถูกเปิด
+แบบ read-only ใน process ของตัวเอง แล้วให้ SQLite รวมค่า (COUNT / AVG / MIN / MAX /
+histogram) ต่อ course ต่อหมวดในไฟล์นั้นเลย ตัวแม่แค่รวมผลเป็นรายงานเดียว
+
+    python term_analytics.py 2021=terms/2021.db 2022=terms/2022.db grades.db
+    python term_analytics.py terms/*.db --course CG2025 --csv report.csv
+    python term_analytics.py terms/*.db --json report.json --workers 4
+
+ชื่อเทอม = ส่วนหน้า "=" หรือชื่อไฟล์ (ไม่รวมนามสกุล)
+"""
+import argparse
+import csv
+import gzip
+import json
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from curve import HIST_BINS
+from db_util import readonly_connect
+
+# (หมวด, prefix ของคอลัมน์ย่อย หรือ None = คอลัมน์เดียว, factor ใน courses)
+CATEGORIES = (
+    ("mid_term", None, None),
+    ("final", None, None),
+    ("project1", None, None),
+    ("project2", None, None),
+    ("homework_score", "hw", "hw_factor"),
+    ("quiz_score", "quiz", "quiz_factor"),
+    ("lab_score", "lab", "lab_factor"),
+    ("class_score", "class", "class_factor"),
+)
+REPORT_COLUMNS = ("term", "course", "name", "category", "n",
+                  "mean", "std", "min", "max")
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})")}
+
+
+def _category_sql(score_cols, course_cols):
+    """[(หมวด, expr)] จากคอลัมน์ที่ไฟล์นี้มีจริง (ไฟล์เทอมเก่าอาจมีจำนวนช่องไม่เท่ากัน)
+
+    คำนวณจากคอลัมน์ดิบ + factor ของ courses (ไฟล์เก่าไม่มี generated column)
+    """
+    exprs = []
+    for key, prefix, factor in CATEGORIES:
+        if prefix is None:
+            expr = f"COALESCE(s.{key}, 0)" if key in score_cols else "0"
+        else:
+            items = sorted((c for c in score_cols if re.fullmatch(fr"{prefix}_\d+", c)),
+                           key=lambda c: int(c.rsplit("_", 1)[1]))
+            total = " + ".join(f"COALESCE(s.{c}, 0)" for c in items) or "0"
+            div = (f"COALESCE(NULLIF(c.{factor}, 0), 1)"
+                   if factor in course_cols else "1")
+            expr = f"({total}) / {div}"
+        exprs.append((key, expr))
+    exprs.append(("total", "(" + " + ".join(e for _, e in exprs) + ")"))
+    return exprs
+
+
+def analyze_file(term, db_path, courses=None):
+    """aggregate ทุก course ในไฟล์เดียว -> [dict ตาม REPORT_COLUMNS + hist]"""
+    tmp = None
+    if db_path.endswith(".gz"):
+        # archive แบบบีบอัด: แตกลงไฟล์ชั่วคราวก่อน (SQLite อ่าน .gz ตรง ๆ ไม่ได้)
+        fd, tmp = tempfile.mkstemp(suffix=".db")
+        with os.fdopen(fd, "wb") as out, gzip.open(db_path, "rb") as src:
+            shutil.copyfileobj(src, out)
+    try:
+        conn = readonly_connect(tmp or db_path)
+        try:
+            return _aggregate(conn, term, courses)
+        finally:
+            conn.close()
+    finally:
+        if tmp:
+            os.remove(tmp)
+
+
+def _aggregate(conn, term, courses):
+    score_cols = _columns(conn, "scores")
+    course_cols = _columns(conn, "courses")
+    cats = _category_sql(score_cols, course_cols)
+    max_total = "c.max_total" if "max_total" in course_cols else "100"
+
+    where = "s.user_id <> 'admin'"
+    params = []
+    if courses:
+        where += " AND s.course IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(list(courses)))
+    base = (f"FROM scores s JOIN courses c ON c.course = s.course WHERE {where}")
+
+    # ทุกหมวดใน scan เดียว: n / sum / sum ของกำลังสอง / min / max ต่อ course
+    aggs = ", ".join(
+        f"SUM({e}) AS sum_{k}, SUM(({e}) * ({e})) AS sq_{k}, "
+        f"MIN({e}) AS min_{k}, MAX({e}) AS max_{k}"
+        for k, e in cats
+    )
+    rows = conn.execute(
+        f"SELECT s.course AS course, c.name AS name, COUNT(*) AS n, {aggs} "
+        f"{base} GROUP BY s.course",
+        params
+    ).fetchall()
+
+    # histogram ของ total (ช่องเดียวกับ curve.hist_bin)
+    total = dict(cats)["total"]
+    hist = {}
+    for course, b, count in conn.execute(
+        f"SELECT s.course, MIN(MAX(CAST(({total}) * {HIST_BINS} / "
+        f"COALESCE(NULLIF({max_total}, 0), 100) AS INTEGER), 0), {HIST_BINS - 1}) AS b, "
+        f"COUNT(*) {base} GROUP BY s.course, b",
+        params
+    ):
+        hist.setdefault(course, [0] * HIST_BINS)[b] = count
+
+    out = []
+    for r in rows:
+        n = r["n"]
+        for key, _ in cats:
+            mean = r[f"sum_{key}"] / n
+            var = max(r[f"sq_{key}"] / n - mean * mean, 0.0)
+            out.append({
+                "term": term, "course": r["course"], "name": r["name"],
+                "category": key, "n": n, "mean": mean, "std": math.sqrt(var),
+                "min": r[f"min_{key}"], "max": r[f"max_{key}"],
+                "hist": hist.get(r["course"]) if key == "total" else None,
+            })
+    return out
+
+
+def term_label(arg):
+    """'2021=path.db' -> ('2021', 'path.db'); 'terms/2022.db' -> ('2022', ...)"""
+    label, sep, path = arg.partition("=")
+    if sep and label and not os.path.exists(arg):
+        return label, path
+    name = os.path.basename(arg)
+    for ext in (".gz", ".db"):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return name, arg
+
+
+def analyze_terms(terms, courses=None, workers=None):
+    """terms = [(ชื่อเทอม, path)] คืนรายการรวมเรียงตาม course / หมวด / ลำดับเทอม"""
+    if not terms:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(terms))
+    # spawn: เหมือน report_cards ไม่ fork process ที่อาจมี thread อยู่
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        parts = list(pool.map(analyze_file,
+                              [t for t, _ in terms], [p for _, p in terms],
+                              [courses] * len(terms)))
+    order = {t: i for i, (t, _) in enumerate(terms)}
+    cat_order = {k: i for i, k in enumerate([k for k, _, _ in CATEGORIES] + ["total"])}
+    rows = [r for part in parts for r in part]
+    rows.sort(key=lambda r: (r["course"], cat_order[r["category"]], order[r["term"]]))
+    return rows
+
+
+def _print_report(rows):
+    print(f"{'course':<12} {'category':<15} {'term':<12} {'n':>6} "
+          f"{'mean':>8} {'std':>8} {'min':>8} {'max':>8}")
+    last = None
+    for r in rows:
+        if last and (r["course"], r["category"]) != last:
+            print()
+        last = (r["course"], r["category"])
+        print(f"{r['course']:<12} {r['category']:<15} {r['term']:<12} {r['n']:>6} "
+              f"{r['mean']:>8.2f} {r['std']:>8.2f} {r['min']:>8.2f} {r['max']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("terms", nargs="+", help="[ชื่อเทอม=]path ของไฟล์ DB")
+    parser.add_argument("--course", action="append", help="เฉพาะ course นี้ (ซ้ำได้)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--csv", help="เขียนรายงานเป็น CSV")
+    parser.add_argument("--json", help="เขียนรายงาน (รวม histogram ของ total) เป็น JSON")
+    args = parser.parse_args()
+
+    terms = [term_label(a) for a in args.terms]
+    missing = [p for _, p in terms if not os.path.exists(p)]
+    if missing:
+        parser.error(f"file not found: {', '.join(missing)}")
+    labels = [t for t, _ in terms]
+    if len(set(labels)) != len(labels):
+        parser.error("term names must be unique (use NAME=path)")
+
+    rows = analyze_terms(terms, args.course, args.workers)
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8-sig") as f:
+            out = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction="ignore")
+            out.writeheader()
+            out.writerows(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=1)
+    if not (args.csv or args.json):
+        _print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import unittest
+
+from ranking import CourseRanking, parse_cutoffs
+
+
+class ParseCutoffsTest(unittest.TestCase):
+    def test_default(self):
+        cutoffs = parse_cutoffs(None)
+        self.assertEqual(cutoffs[0], (0.0, "F"))
+        self.assertEqual(cutoffs[-1], (80.0, "A"))
+
+    def test_requires_zero_floor(self):
+        # ไม่มีเกณฑ์ 0: คะแนนต่ำกว่าทุกเกณฑ์จะได้เกรดต่ำสุดที่ตั้งไว้ (B) -> ต้อง reject
+        with self.assertRaises(ValueError):
+            parse_cutoffs("A:80, B:70")
+
+    def test_bad_format(self):
+        with self.assertRaises(ValueError):
+            parse_cutoffs("A80, F:0")
+
+
+class CourseRankingTest(unittest.TestCase):
+    def test_letter_below_lowest_cutoff(self):
+        ranking = CourseRanking([10, 50, 90], parse_cutoffs("A:80, B:70, F:0"), 100)
+        self.assertEqual(ranking.letter(10), "F")
+        self.assertEqual(ranking.letter(70), "B")
+        self.assertEqual(ranking.letter(90), "A")
+
+    def test_letter_uses_max_total(self):
+        ranking = CourseRanking([], parse_cutoffs("A:80, F:0"), 50)
+        self.assertEqual(ranking.letter(40), "A")
+        self.assertEqual(ranking.letter(39.9), "F")
+
+    def test_rank_and_percentile(self):
+        ranking = CourseRanking([10, 50, 50, 90], parse_cutoffs(None), 100)
+        self.assertEqual(ranking.rank(90), 1)
+        self.assertEqual(ranking.rank(50), 2)
+        self.assertEqual(ranking.rank(10), 4)
+        self.assertEqual(ranking.percentile(50), 75.0)
+
+
+if __name__ == "__main__":
+    unittest.main()